@@ -1,5 +1,65 @@
-from Crypto.Hash import CMAC
-from Crypto.Cipher import AES
+from functools import lru_cache
+from aes_ecb import get_aes_ecb
+from aes_ecb import CIPHER_CACHE_SIZE
+
+def _cmac_subkey(v):
+    """
+    RFC 4493 2.3 Subkey Generation Algorithm, one step of the shift.
+        v: 128 bits int.
+    """
+    v <<= 1
+    if v >> 128:
+        v = (v & ((1<<128)-1)) ^ 0x87
+    return v
+
+class AES_CMAC_CTX():
+    """
+    the AES cipher and the subkeys K1, K2 of a key.
+    it's never changed after it's made so that it can be shared by the cache.
+    """
+    def __init__(self, key):
+        self.encrypt = get_aes_ecb(key).encrypt_block
+        L = int.from_bytes(self.encrypt(bytes(16)), "big")
+        self.k1 = _cmac_subkey(L)
+        self.k2 = _cmac_subkey(self.k1)
+
+    def digest(self, msg):
+        """
+        RFC 4493 2.4 MAC Generation Algorithm
+            msg: any size of bytes or bytearray.
+            return: 16 bytes of CMAC.
+        """
+        size = len(msg)
+        # offset of the last block, which is handled with K1 or K2.
+        offset = (size-1)//16*16 if size else 0
+        last = bytes(msg[offset:])
+        if len(last) == 16:
+            last_i = int.from_bytes(last, "big") ^ self.k1
+        else:
+            last = last + b"\x80" + b"\x00"*(15-len(last))
+            last_i = int.from_bytes(last, "big") ^ self.k2
+        X = 0
+        for i in range(0, offset, 16):
+            X ^= int.from_bytes(msg[i:i+16], "big")
+            X = int.from_bytes(self.encrypt(X.to_bytes(16, "big")), "big")
+        return self.encrypt((X ^ last_i).to_bytes(16, "big"))
+
+__cmac_ctx_cache = lru_cache(maxsize=CIPHER_CACHE_SIZE)(AES_CMAC_CTX)
+
+def get_cmac_ctx(key):
+    """
+    return an AES_CMAC_CTX object of the key from the LRU cache.
+    the subkeys are generated only when the key is not in the cache.
+        key: 16 bytes of bytes or bytearray.
+    """
+    return __cmac_ctx_cache(bytes(key))
+
+def cmac_ctx_cache_info():
+    """
+    return the statistics of the cache in functools' CacheInfo,
+    i.e. hits, misses, maxsize, currsize.
+    """
+    return __cmac_ctx_cache.cache_info()
 
 class AES_CMAC():
     """
@@ -9,19 +69,20 @@ class AES_CMAC():
     8E1A0ED893AB9A3D891CDEF2878CDB59
     """
     def __init__(self, key):
-        self.cmac = CMAC.new(key, ciphermod=AES)
+        self.ctx = get_cmac_ctx(key)
+        self.msg = bytearray()
 
     def update(self, data):
-        self.cmac.update(data)
+        self.msg += data
 
     def digest(self):
-        return self.cmac.digest()
+        return self.ctx.digest(self.msg)
 
     def hex(self, upper=False):
         if upper:
-            return self.cmac.hexdigest().upper()
+            return self.digest().hex().upper()
         else:
-            return self.cmac.hexdigest()
+            return self.digest().hex()
 
 """
 RFC 4493
@@ -91,3 +152,31 @@ if __name__ == "__main__":
         else:
             print("ERROR")
 
+    # cross-check with pycryptodome for every length class of the message,
+    # i.e. empty, multiple of the block size, and with a partial last block,
+    # in bytes, bytearray and memoryview as lorawan_cipher passes.
+    import random
+    from Crypto.Cipher import AES
+    from Crypto.Hash import CMAC
+    rnd = random.Random(0)
+    for name, sizes in [("len = 0", [0]),
+                        ("len = 16n", range(16, 16*16+1, 16)),
+                        ("len = 16n+r", [n for n in range(1, 16*16)
+                                         if n % 16])]:
+        nb_error = 0
+        nb_test = 0
+        for size in sizes:
+            for _ in range(8):
+                key = bytes(rnd.randrange(256) for _ in range(16))
+                msg = bytes(rnd.randrange(256) for _ in range(size))
+                expected = CMAC.new(key, msg=msg, ciphermod=AES).digest()
+                ctx = AES_CMAC_CTX(key)
+                for m in [msg, bytearray(msg), memoryview(msg)]:
+                    nb_test += 1
+                    if ctx.digest(m) != expected:
+                        nb_error += 1
+        print("{} with pycryptodome: {} tests".format(name, nb_test), end=" ")
+        if nb_error == 0:
+            print("OK")
+        else:
+            print("ERROR {}".format(nb_error))
@@ -1,34 +1,61 @@
 #
 # a wrapper module for pycryptodome.
 #
-from Crypto.Cipher import AES
+from functools import lru_cache
+
+# number of keys of which ciphers are kept in the cache.
+CIPHER_CACHE_SIZE = 16
 
 class AES_ECB():
     def __init__(self, key):
         """
         key: 8 bytes of bytearray
         """
+        # pycryptodome is imported when a key is used first,
+        # so that a script which doesn't decrypt starts quickly.
+        from Crypto.Cipher import AES
         self.aes_ecb = AES.new(key, AES.MODE_ECB)
 
     def encrypt(self, data):
         """
         data: any size of bytearray. expanded into 16 bytes if less.
         """
-        blk_list = []
-        for i in range(0,len(data),16):
-            blk = data[i:i+16]
-            blk += b"\x00"*(16-len(blk))
-            blk_list.append(self.aes_ecb.encrypt(bytes(blk)))
-        return b"".join(blk_list)
+        data = bytes(data)
+        if len(data) % 16:
+            data += b"\x00"*(16-len(data)%16)
+        return self.aes_ecb.encrypt(data)
+
+    def encrypt_block(self, block):
+        """
+        block: 16 bytes of bytes. it's not padded nor copied,
+        so that a caller encrypting many blocks, e.g. CMAC, doesn't pay for it.
+        """
+        return self.aes_ecb.encrypt(block)
 
     def decrypt(self, enc_data):
         """
         enc_data: in bytearray, must be multiple of 16.
         """
-        blk_list = []
-        for i in range(0,len(enc_data),16):
-            blk_list.append(self.aes_ecb.decrypt(data[i:i+16]))
-        return b"".join(blk_list)
+        return self.aes_ecb.decrypt(bytes(enc_data))
+
+# AES_ECB doesn't keep any state between the calls,
+# so that an object can be shared by the callers using the same key.
+__aes_ecb_cache = lru_cache(maxsize=CIPHER_CACHE_SIZE)(AES_ECB)
+
+def get_aes_ecb(key):
+    """
+    return an AES_ECB object of the key from the LRU cache.
+    the key schedule is expanded only when the key is not in the cache.
+        key: 16 bytes of bytes or bytearray.
+    """
+    return __aes_ecb_cache(bytes(key))
+
+def aes_ecb_cache_info():
+    """
+    return the statistics of the cache in functools' CacheInfo,
+    i.e. hits, misses, maxsize, currsize.
+    """
+    return __aes_ecb_cache.cache_info()
 
 def aes128_encrypt(key, plain_data):
     """
@@ -37,7 +64,7 @@ def aes128_encrypt(key, plain_data):
         key: in bytes.
         plain_data: in bytes.
     """
-    cipher = AES_ECB(key)
+    cipher = get_aes_ecb(key)
     return cipher.encrypt(plain_data)
 
 def aes128_decrypt(key, enc_data):
@@ -47,6 +74,6 @@ def aes128_decrypt(key, enc_data):
         key: in bytes.
         plain_data: in bytes.
     """
-    cipher = AES_ECB(key)
+    cipher = get_aes_ecb(key)
     return cipher.decrypt(enc_data)
 
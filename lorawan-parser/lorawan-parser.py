@@ -4,7 +4,13 @@ import sys
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 from lorawan_a2b_hex import a2b_hex
 from lorawan_parser import parse_phy_pdu
-from lorawan_cipher import lorawan_get_keys
+# NOTE:
+#   the modules only needed by some options, e.g. json and lorawan_batch
+#   for jsonl, are imported where they are used so that a simple
+#   invocation in a shell loop starts quickly.
+
+# size of the buffer to read the input file in jsonl.
+READ_CHUNK_SIZE = 1024*1024
 
 ap = ArgumentParser(
         description="""
@@ -49,6 +55,22 @@ ap.add_argument("--string-type", action="store", dest="string_type",
 ap.add_argument("--separator", action="store", dest="separator",
                 help="""specify a separator between the output to decode
                 multiple frames at once.""")
+ap.add_argument("--format", action="store", dest="format",
+                default="text", choices=["text", "jsonl"],
+                help="""specify the output format, either text or jsonl.
+                jsonl prints one compact JSON record per frame.""")
+ap.add_argument("--batch-size", action="store", dest="batch_size",
+                type=int, default=1000,
+                help="""specify the number of JSON records written
+                to the output at once.""")
+ap.add_argument("--workers", action="store", dest="workers",
+                type=int, default=1,
+                help="""specify the number of processes to decode frames
+                in jsonl. 0 means the number of CPUs.""")
+ap.add_argument("--chunk-size", action="store", dest="chunk_size",
+                type=int, default=256,
+                help="""specify the number of frames passed to a process
+                at once in jsonl.""")
 ap.add_argument("-v", action="store_true", dest="verbose",
                 help="enable verbose mode.")
 ap.add_argument("-d", action="append_const", dest="_f_debug", default=[],
@@ -74,6 +96,7 @@ if opt.join_r is not None and opt.join_a is not None:
                                    parse_only=(False if opt.debug_level > 1 else
                                                True))
         #
+        from lorawan_cipher import lorawan_get_keys
         keys = lorawan_get_keys(appkey,
                                 devnonce=msg_join_r["body"]["devnonce"],
                                 appnonce=msg_join_a["body"]["appnonce"],
@@ -87,7 +110,50 @@ if opt.join_r is not None and opt.join_a is not None:
     else:
         raise ValueError("ERROR: appkey is required to produce NwkSKey and AppSKey.")
 
-if opt.input_file:
+def print_jsonl(lines, decoder):
+    """
+    decode each line and print a JSON record per frame in the input order.
+        lines: an iterable of lines.
+        decoder: BatchDecoder.
+    the records are made in the workers, and written here every
+    opt.batch_size frames while the workers decode the next chunks.
+    """
+    records = []
+    for chunk_records in decoder.encode_lines(lines):
+        records.extend(chunk_records)
+        if len(records) >= opt.batch_size:
+            sys.stdout.write("\n".join(records) + "\n")
+            sys.stdout.flush()
+            records = []
+    if records:
+        sys.stdout.write("\n".join(records) + "\n")
+        sys.stdout.flush()
+
+if opt.format == "jsonl":
+    if opt.input_file:
+        if opt.input_file in ["-", "stdin"]:
+            lines = sys.stdin
+        else:
+            # read lines through a large buffer.
+            lines = open(opt.input_file, buffering=READ_CHUNK_SIZE)
+    else:
+        if len(opt.phy_pdu) == 0:
+            ap.print_help()
+            exit(0)
+        lines = ["".join(opt.phy_pdu)]
+    from lorawan_batch import BatchDecoder
+    with BatchDecoder(nwkskey=nwkskey, appskey=appskey, appkey=appkey,
+                      version=opt.version, upper_fcnt=a2b_hex(opt.upper_fcnt),
+                      string_type=opt.string_type,
+                      workers=(None if opt.workers == 0 else opt.workers),
+                      chunk_size=opt.chunk_size) as decoder:
+        print_jsonl(lines, decoder)
+        if opt.verbose:
+            for pid,st in decoder.worker_stats().items():
+                print("## worker {}: {} frames in {:.3f} sec, {:.0f} frames/sec"
+                      .format(pid, st["frames"], st["seconds"], st["fps"]),
+                      file=sys.stderr)
+elif opt.input_file:
     if opt.input_file in ["-", "stdin"]:
         fd = sys.stdin
     else:
@@ -1,5 +1,7 @@
-import re
-from base64 import b64decode
+# separators removed from a hex string which is not clean.
+# re is imported and the pattern is compiled when it's needed first,
+# because a clean hex string doesn't need it.
+_re_hex_separator = None
 
 def a2b_hex(buf, string_type="hexstr"):
     """
@@ -11,18 +13,41 @@ def a2b_hex(buf, string_type="hexstr"):
     if isinstance(buf, list):
         buf = "".join(buf)
     if string_type == "base64":
+        from base64 import b64decode
         return bytearray(b64decode(buf))
-    elif "." in buf:
+    try:
+        # fast path for a clean hex string like "40C1D252".
+        return bytearray.fromhex(buf)
+    except ValueError:
+        pass
+    if "." in buf:
         # in case like "a4.9.0.19"
         hexstr = "".join([i.rjust(2,"0") for i in buf.split(".")])
     else:
         # others
-        hexstr = re.sub(r"([,\s\n]|0x)", "", buf)
+        global _re_hex_separator
+        if _re_hex_separator is None:
+            import re
+            _re_hex_separator = re.compile(r"([,\s\n]|0x)")
+        hexstr = _re_hex_separator.sub("", buf)
     if len(hexstr)%2 == 1:
         raise ValueError("the length of hexstr is not even. len={} hexstr={}"
                          .format(len(hexstr), hexstr))
     return bytearray.fromhex(hexstr)
 
+def a2b_hex_list(bufs, string_type="hexstr"):
+    """
+    convert a list of hex strings at once.
+    return a list of bytearray.
+    if any of them is not clean, each is converted by a2b_hex().
+    """
+    if string_type == "hexstr":
+        try:
+            return list(map(bytearray.fromhex, bufs))
+        except (ValueError, TypeError):
+            pass
+    return [a2b_hex(buf, string_type=string_type) for buf in bufs]
+
 if __name__ == "__main__":
     test_list = [
         "402105810080160102a6bf4432169ea0784416868d9420dd244619443e",
@@ -36,6 +61,9 @@ if __name__ == "__main__":
     for d in test_list:
         print("*  ", d)
         print(" =>", a2b_hex(d).hex())
+    print("*   list")
+    for v in a2b_hex_list(test_list):
+        print(" =>", v.hex())
     d = "IM7jjKOUkVEf405egXcnkBPNCoKH6CIUgJgY5Op90XmQ"
     print("*  ", d)
     print(" =>", a2b_hex(d, string_type="base64").hex())
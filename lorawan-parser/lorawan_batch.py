@@ -0,0 +1,197 @@
+import os
+import time
+import json
+import multiprocessing
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from lorawan_a2b_hex import a2b_hex
+from lorawan_parser import decode_frame, frame_to_dict
+
+# number of frames passed to a worker at once.
+DEFAULT_CHUNK_SIZE = 256
+# number of chunks submitted ahead per worker, so that the workers
+# don't wait while the caller reads the input or writes the output.
+DEFAULT_CHUNKS_AHEAD = 2
+
+def _decode_chunk(frames, params):
+    """
+    decode a chunk of frames in a worker.
+        frames: a list of hex strings (or base64 strings), bytes or bytearray.
+        params: a dict of the arguments of decode_frame() and string_type.
+        return: (pid, seconds, results)
+    """
+    t0 = time.perf_counter()
+    string_type = params["string_type"]
+    results = []
+    for frame in frames:
+        try:
+            if isinstance(frame, str):
+                frame = a2b_hex(frame, string_type=string_type)
+            results.append(decode_frame(frame, nwkskey=params["nwkskey"],
+                                        appskey=params["appskey"],
+                                        appkey=params["appkey"],
+                                        version=params["version"],
+                                        upper_fcnt=params["upper_fcnt"]))
+        except Exception as e:
+            # any error of a frame is reported in its record, so that
+            # the rest of the chunk is not lost.
+            results.append(e)
+    return os.getpid(), time.perf_counter() - t0, results
+
+def _encode_chunk(first_line, lines, params):
+    """
+    decode a chunk of lines into JSON records in a worker.
+        first_line: the line number of lines[0].
+        lines: a list of lines of hex strings (or base64 strings).
+            empty lines are skipped.
+        params: same as _decode_chunk().
+        return: (pid, seconds, records)
+            a record is a JSON string of frame_to_dict(), or of the line
+            number and the error if the line couldn't be decoded.
+    """
+    frames = []
+    line_nos = []
+    for n,line in enumerate(lines, start=first_line):
+        line = line.strip()
+        if line:
+            frames.append(line)
+            line_nos.append(n)
+    pid, seconds, results = _decode_chunk(frames, params)
+    t0 = time.perf_counter()
+    records = []
+    for n,frame in zip(line_nos, results):
+        if isinstance(frame, Exception):
+            rec = { "line": n, "error": str(frame) }
+        else:
+            rec = frame_to_dict(frame)
+        records.append(json.dumps(rec, separators=(",",":")))
+    return pid, seconds + time.perf_counter() - t0, records
+
+class BatchDecoder():
+    """
+    decode many frames on multiple processes.
+    the frames are sharded into chunks of chunk_size frames,
+    and the results are returned in the input order.
+
+    e.g.
+        with BatchDecoder(appskey=appskey, workers=16) as bd:
+            for frame in bd.decode(hexstr_list):
+                print(frame)
+            print(bd.worker_stats())
+
+    workers: the number of processes. None means os.cpu_count().
+             1 means that the frames are decoded in the calling process.
+    chunks_ahead: the number of chunks in flight per worker.
+        the next chunks are submitted before the result of the oldest one
+        is taken, so that the workers are kept busy across the reads of
+        the input.
+    """
+    def __init__(self, nwkskey=None, appskey=None, appkey=None,
+                 version="1.0.3", upper_fcnt=b"\x00\x00",
+                 string_type="hexstr", workers=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE,
+                 chunks_ahead=DEFAULT_CHUNKS_AHEAD):
+        self.params = {
+                "nwkskey": nwkskey,
+                "appskey": appskey,
+                "appkey": appkey,
+                "version": version,
+                "upper_fcnt": upper_fcnt,
+                "string_type": string_type,
+                }
+        self.chunk_size = chunk_size
+        self.stats = {}
+        if workers == 1:
+            self.executor = None
+            self.window = 1
+        else:
+            self.window = (workers or os.cpu_count() or 1)*chunks_ahead
+            # fork is used where it's available so that the workers
+            # don't import the main script again.
+            if "fork" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("fork")
+            else:
+                ctx = None
+            self.executor = ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=ctx)
+
+    def _map_ahead(self, func, tasks):
+        """
+        call func(*args, self.params) for each args in tasks,
+        and yield the results in the order of tasks.
+        up to self.window tasks are in flight on the workers.
+        """
+        if self.executor is None:
+            for args in tasks:
+                yield self._count(func(*args, self.params))
+            return
+        pending = deque()
+        for args in tasks:
+            pending.append(self.executor.submit(func, *args, self.params))
+            if len(pending) >= self.window:
+                yield self._count(pending.popleft().result())
+        while pending:
+            yield self._count(pending.popleft().result())
+
+    def _count(self, result):
+        pid, seconds, chunk_result = result
+        st = self.stats.setdefault(pid, { "frames": 0, "seconds": 0. })
+        st["frames"] += len(chunk_result)
+        st["seconds"] += seconds
+        return chunk_result
+
+    def decode(self, frames):
+        """
+        frames: a list of hex strings (or base64 strings), bytes or bytearray.
+        return: a list of DecodedFrame in the same order of frames.
+            the exception is put instead if the frame couldn't be decoded.
+        """
+        tasks = ((frames[i:i+self.chunk_size],)
+                 for i in range(0, len(frames), self.chunk_size))
+        ret = []
+        for chunk_result in self._map_ahead(_decode_chunk, tasks):
+            ret.extend(chunk_result)
+        return ret
+
+    def encode_lines(self, lines):
+        """
+        decode lines of frames into JSON records as lorawan-parser.py prints.
+            lines: an iterable of lines, e.g. a file.  it's read as
+                the workers take the chunks, not at once.
+            return: an iterator of lists of JSON strings, a list per chunk,
+                in the input order.  empty lines are skipped, and the line
+                numbers in the error records count from 1.
+        JSON is also encoded in the workers, so the caller only writes.
+        """
+        def tasks():
+            it = iter(lines)
+            first_line = 1
+            while True:
+                chunk = list(islice(it, self.chunk_size))
+                if not chunk:
+                    return
+                yield first_line, chunk
+                first_line += len(chunk)
+        return self._map_ahead(_encode_chunk, tasks())
+
+    def worker_stats(self):
+        """
+        return the throughput of each worker.
+            a dict like { pid: { "frames": n, "seconds": t, "fps": n/t } }
+            t is the time spent on decoding in the worker.
+        """
+        return { pid:dict(st, fps=(st["frames"]/st["seconds"]
+                                   if st["seconds"] else 0.))
+                for pid,st in self.stats.items() }
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
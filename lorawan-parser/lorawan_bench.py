@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import subprocess
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from lorawan_a2b_hex import a2b_hex
+from lorawan_parser import decode_phy_pdu
+from lorawan_parser import MTYPE_UNCONFIRMED_DATA_UP
+from lorawan_parser import MTYPE_CONFIRMED_DATA_UP
+from lorawan_parser import MTYPE_UNCONFIRMED_DATA_DOWN
+from lorawan_encoder import encode_data_frame
+from lorawan_batch import BatchDecoder
+
+# the directory of this file.
+__here = os.path.dirname(os.path.abspath(__file__))
+
+# the frames in packet.csv of ppico.
+DEFAULT_CSV = os.path.join(__here, "..", "packet.csv")
+# the numbers to be compared with, saved by --save on this host.
+# it's not in the repository, because the numbers of another host
+# can't be compared.
+DEFAULT_BASELINE = os.path.join(__here, "lorawan_bench_baseline.json")
+# the number of synthetic data frames in the corpus. it must be larger
+# than the key stream cache in lorawan_cipher not to measure only XOR.
+SYNTHETIC_FRAMES = 512
+
+# the keys of the corpus.
+NWKSKEY = a2b_hex("70ff6652c80bcee90b21f2d74bf336b2")
+APPSKEY = a2b_hex("51ebd6666d77121b3782ef59a252e013")
+APPKEY = a2b_hex("BEEF000102030405060708090A0B0C0D")
+DEVADDR = a2b_hex("2bbe0934")
+
+# Join Request and Join Accept in README.md, which are made by APPKEY.
+JOIN_FRAMES = [
+    "00050403020100efbe050403020100efbe87bcc54c5b5f",
+    "20b46c0022dae91f38e172ac0312d4bc5b",
+    ]
+
+# MAC commands of the synthetic frames, in FOpts or in FRMPayload of FPort 0.
+MAC_CMDS = [
+    "0307", "03070507", "0307050707030703", "0602", "06ff3f",
+    "037f00ff01", "0705e0b58c50", "0406", "0801", "0a03e0b58c",
+    ]
+
+"""
+Benchmarks
+    name: (keys passed to decode_phy_pdu(), description)
+"""
+BENCHMARKS = {
+    "header": ({},
+               "header-only parse without keys."),
+    "decrypt": ({ "appskey": APPSKEY, "appkey": APPKEY },
+                "decrypt FRMPayload and Join Accept."),
+    "mic": ({ "nwkskey": NWKSKEY },
+            "verify MIC of data frames."),
+    "full": ({ "nwkskey": NWKSKEY, "appskey": APPSKEY, "appkey": APPKEY },
+             "decrypt and verify MIC of all frames."),
+    }
+
+# the number of lines decoded in each round of the sweep of workers.
+# the corpus is repeated up to this number.
+SWEEP_FRAMES = 100000
+
+# the frame in README.md to pass to lorawan-parser.py.
+README_FRAME = "403409be2b80000002c7fb8963476d5bf4090e6b867a40b597047241eb80aef79df6"
+PARSER_SCRIPT = os.path.join(__here, "lorawan-parser.py")
+
+"""
+Budgets of the startup of lorawan-parser.py
+    name: (arguments, budget)
+    budget: the total of the cumulative import time in usec
+        reported by python -X importtime.
+"""
+STARTUP_BUDGETS = {
+    "help": (["--help"], 40000),
+    "header": ([README_FRAME], 40000),
+    "decrypt": ([README_FRAME, "--appskey", APPSKEY.hex()], 60000),
+    }
+
+def read_csv_frames(csv_path):
+    """
+    make data frames from the payloads in packet.csv.
+        return: a list of bytearray.
+    the payloads in packet.csv are already decrypted. so, they are encrypted
+    again by the keys of the corpus with the port and the counter in it.
+    the rows which can't be read are skipped.
+    """
+    frames = []
+    with open(csv_path) as fd:
+        header = fd.readline().rstrip("\n").split(";")
+        for line in fd:
+            row = dict(zip(header, line.rstrip("\n").split(";")))
+            try:
+                payload = a2b_hex(row["data"])
+                fport = int(row["port"])
+                fcnt = int(row["counter"])
+            except (KeyError, ValueError):
+                continue
+            if not payload or not 0 < fport < 224:
+                continue
+            frames.append(encode_data_frame(DEVADDR, fcnt, fport=fport,
+                                            payload=payload,
+                                            nwkskey=NWKSKEY, appskey=APPSKEY,
+                                            mtype=MTYPE_UNCONFIRMED_DATA_UP))
+    return frames
+
+def make_synthetic_frames(n, seed=0):
+    """
+    make data frames of application data and MAC commands.
+        return: a list of bytearray.
+    """
+    rnd = random.Random(seed)
+    frames = []
+    for fcnt in range(n):
+        kind = rnd.choice(["app", "app", "fopts", "fopts+app", "port0"])
+        mtype = rnd.choice([MTYPE_UNCONFIRMED_DATA_UP, MTYPE_CONFIRMED_DATA_UP,
+                            MTYPE_UNCONFIRMED_DATA_DOWN])
+        cmds = a2b_hex(rnd.choice(MAC_CMDS))
+        app = bytes(rnd.randrange(256) for _ in range(rnd.randint(1, 51)))
+        kwargs = {}
+        if kind in ["fopts", "fopts+app"]:
+            kwargs["fopts"] = cmds
+        if kind in ["app", "fopts+app"]:
+            kwargs.update(fport=rnd.randint(1, 223), payload=app)
+        elif kind == "port0":
+            kwargs.update(fport=0, payload=cmds)
+        frames.append(encode_data_frame(DEVADDR, fcnt, nwkskey=NWKSKEY,
+                                        appskey=APPSKEY, mtype=mtype,
+                                        **kwargs))
+    return frames
+
+def build_corpus(csv_path=DEFAULT_CSV, n_synthetic=SYNTHETIC_FRAMES):
+    """
+    return a list of frames in bytearray; the frames in packet.csv,
+    the synthetic data frames and Join Request/Accept.
+    """
+    frames = []
+    if csv_path and os.path.exists(csv_path):
+        frames.extend(read_csv_frames(csv_path))
+    frames.extend(make_synthetic_frames(n_synthetic))
+    frames.extend(a2b_hex(f) for f in JOIN_FRAMES)
+    return frames
+
+def run_benchmark(corpus, keys, repeat=5):
+    """
+    decode all frames in the corpus repeat times.
+        return: frames/sec of the fastest round.
+    """
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for frame in corpus:
+            decode_phy_pdu(frame, **keys)
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return len(corpus)/best
+
+def run_all(corpus, names=None, repeat=5):
+    """
+    return: a dict of { name: frames/sec }.
+    """
+    return { name:run_benchmark(corpus, BENCHMARKS[name][0], repeat=repeat)
+            for name in (names or BENCHMARKS) }
+
+def run_workers(corpus, workers, keys, n_frames=SWEEP_FRAMES, repeat=5,
+                chunk_size=None):
+    """
+    decode the corpus into JSON records on workers processes as
+    lorawan-parser.py --format jsonl does.
+        return: frames/sec of the fastest round.
+    the pool is started and warmed up before the rounds.
+    """
+    lines = [f.hex() for f in corpus]
+    lines = (lines*(n_frames//len(lines) + 1))[:n_frames]
+    kwargs = {} if chunk_size is None else { "chunk_size": chunk_size }
+    best = None
+    with BatchDecoder(workers=workers, **keys, **kwargs) as decoder:
+        for _ in decoder.encode_lines(lines[:len(corpus)]):
+            pass
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in decoder.encode_lines(lines):
+                pass
+            t = time.perf_counter() - t0
+            best = t if best is None else min(best, t)
+    return n_frames/best
+
+def measure_import_time(args, repeat=5):
+    """
+    run lorawan-parser.py with python -X importtime repeat times.
+        return: the total import time in usec of the fastest run.
+    the bytecode is written and read even if PYTHONDONTWRITEBYTECODE is set,
+    because the scripts are run with the cached bytecode where it's installed.
+    the first run, which may compile the modules, is not counted.
+    """
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    best = None
+    for i in range(repeat + 1):
+        p = subprocess.run([sys.executable, "-X", "importtime",
+                            PARSER_SCRIPT] + args,
+                           cwd=__here, env=env, capture_output=True,
+                           text=True)
+        usec = 0
+        for line in p.stderr.splitlines():
+            # e.g. "import time:  1618 |  12977 | argparse"
+            # only the modules imported at the top level are added.
+            f = line.split("|")
+            if (line.startswith("import time:") and len(f) == 3 and
+                    f[1].strip().isdigit() and not f[2].startswith("  ")):
+                usec += int(f[1])
+        if i > 0:
+            best = usec if best is None else min(best, usec)
+    return best
+
+def load_baseline(path):
+    """
+    return: the baseline saved on this host, or None if there is no
+        baseline or it was saved on another host.
+    """
+    try:
+        with open(path) as fd:
+            baseline = json.load(fd)
+    except FileNotFoundError:
+        return None
+    if baseline.get("host") != platform.node():
+        print("## the baseline in {} is of another host {}, not compared."
+              .format(path, baseline.get("host")))
+        return None
+    return baseline
+
+def save_baseline(path, results, n_frames):
+    with open(path, "w") as fd:
+        json.dump({
+                "host": platform.node(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "frames": n_frames,
+                "results": { k:round(v) for k,v in results.items() },
+                }, fd, indent=4)
+        fd.write("\n")
+
+if __name__ == "__main__":
+    ap = ArgumentParser(
+            description="""
+            throughput benchmark of the decoders in lorawan_parser.
+            the results are compared with the baseline.
+            """,
+            formatter_class=ArgumentDefaultsHelpFormatter)
+    ap.add_argument("names", metavar="NAME", type=str, nargs="*",
+                    help="""specify the benchmarks to run, {}.
+                    all of them are run if not specified."""
+                    .format(", ".join(BENCHMARKS)))
+    ap.add_argument("--csv", action="store", dest="csv_path",
+                    default=DEFAULT_CSV,
+                    help="specify packet.csv to make the corpus.")
+    ap.add_argument("--synthetic", action="store", dest="n_synthetic",
+                    type=int, default=SYNTHETIC_FRAMES,
+                    help="specify the number of synthetic data frames.")
+    ap.add_argument("--repeat", action="store", dest="repeat",
+                    type=int, default=5,
+                    help="specify the number of rounds of each benchmark.")
+    ap.add_argument("--baseline", action="store", dest="baseline",
+                    default=DEFAULT_BASELINE,
+                    help="specify the baseline file.")
+    ap.add_argument("--save", action="store_true", dest="save",
+                    help="save the results as the baseline.")
+    ap.add_argument("--startup", action="store_true", dest="startup",
+                    help="""measure the import time of lorawan-parser.py
+                    instead, and check it with the budgets.""")
+    ap.add_argument("--workers", action="store", dest="workers",
+                    help="""run the sweep of the number of workers instead,
+                    e.g. 1,2,4,8,16. the frames are decoded into JSON
+                    records by BatchDecoder with the keys of full.""")
+    ap.add_argument("--chunk-size", action="store", dest="chunk_size",
+                    type=int,
+                    help="specify the chunk size of the sweep of workers.")
+    ap.add_argument("--fail-below", action="store", dest="fail_below",
+                    type=float,
+                    help="""exit with 1 if any result is slower than
+                    this ratio to the baseline of this host, e.g. 0.8.
+                    it exits with 2 if there is no baseline of this host,
+                    unless --save is specified to make it.""")
+    opt = ap.parse_args()
+    if opt.startup:
+        failed = False
+        print("{:<10} {:>12} {:>12}".format("startup", "import usec",
+                                             "budget"))
+        for name,(args, budget) in STARTUP_BUDGETS.items():
+            usec = measure_import_time(args, repeat=opt.repeat)
+            print("{:<10} {:>12} {:>12}{}".format(
+                  name, usec, budget, "" if usec <= budget else " OVER"))
+            failed = failed or usec > budget
+        sys.exit(1 if failed else 0)
+    if opt.workers:
+        try:
+            workers_list = [int(w) for w in opt.workers.split(",")]
+        except ValueError:
+            ap.error("--workers must be numbers separated by comma.")
+        corpus = build_corpus(opt.csv_path, opt.n_synthetic)
+        print("## corpus: {} frames, {} frames per round, {} CPUs".format(
+              len(corpus), SWEEP_FRAMES, os.cpu_count()))
+        print("{:<10} {:>12} {:>9} {:>11}".format(
+              "workers", "frames/sec", "speedup", "efficiency"))
+        base = None
+        for workers in workers_list:
+            fps = run_workers(corpus, workers, BENCHMARKS["full"][0],
+                              repeat=opt.repeat, chunk_size=opt.chunk_size)
+            base = base or fps/workers_list[0]
+            print("{:<10} {:>12.0f} {:>9.2f} {:>11.2f}".format(
+                  workers, fps, fps/base, fps/base/workers))
+        sys.exit(0)
+    for name in opt.names:
+        if name not in BENCHMARKS:
+            ap.error("unknown benchmark {}".format(name))
+    #
+    corpus = build_corpus(opt.csv_path, opt.n_synthetic)
+    print("## corpus: {} frames".format(len(corpus)))
+    results = run_all(corpus, names=opt.names, repeat=opt.repeat)
+    baseline = load_baseline(opt.baseline)
+    if baseline is None and opt.fail_below is not None and not opt.save:
+        print("## no baseline of this host to check --fail-below.",
+              "run with --save first.")
+        sys.exit(2)
+    base_results = baseline["results"] if baseline else {}
+    failed = False
+    print("{:<10} {:>12} {:>12} {:>7}".format(
+          "benchmark", "frames/sec", "baseline", "ratio"))
+    for name,fps in results.items():
+        base = base_results.get(name)
+        if base:
+            ratio = fps/base
+            print("{:<10} {:>12.0f} {:>12.0f} {:>7.2f}".format(
+                  name, fps, base, ratio))
+            if opt.fail_below is not None and ratio < opt.fail_below:
+                failed = True
+        else:
+            print("{:<10} {:>12.0f} {:>12} {:>7}".format(name, fps, "-", "-"))
+    if opt.save:
+        save_baseline(opt.baseline, results, len(corpus))
+        print("## saved the baseline in {}".format(opt.baseline))
+    if failed:
+        print("## slower than {} of the baseline.".format(opt.fail_below))
+        sys.exit(1)
@@ -1,6 +1,9 @@
+from functools import lru_cache
 from aes_ecb import aes128_encrypt
-from aes_ecb import AES_ECB
-from aes_cmac import AES_CMAC
+from aes_ecb import get_aes_ecb
+from aes_ecb import aes_ecb_cache_info
+from aes_cmac import get_cmac_ctx
+from aes_cmac import cmac_ctx_cache_info
 
 # Note:
 #     The arguments of the following functions are ordered in big endian.
@@ -15,6 +18,25 @@ from aes_cmac import AES_CMAC
 UP_LINK = 0
 DOWN_LINK = 1
 
+# the number of key streams of FRMPayload kept for the frames
+# which are encrypted or decrypted again, e.g. a resent frame.
+KEYSTREAM_CACHE_SIZE = 64
+
+@lru_cache(maxsize=KEYSTREAM_CACHE_SIZE)
+def __frmp_keystream(key, devaddr, fcnt, msg_dir, size):
+    """
+    the key stream S of FRMPayload in int, all arguments must be hashable.
+    """
+    # A_i is Ai_prefix | i, put both devaddr and fcnt in little endian.
+    Ai_prefix = (b"\x01\x00\x00\x00\x00" + bytes([msg_dir]) +
+                 devaddr[::-1] + fcnt[::-1] + b"\x00")
+    # build all of A_i in one buffer and encrypt them in one call.
+    # ctr is 1 origin and wraps in 1 byte.
+    A = b"".join([Ai_prefix + bytes([ctr & 0xff])
+                  for ctr in range(1, (size+15)//16+1)])
+    S = get_aes_ecb(key).encrypt(A)
+    return int.from_bytes(S[:size], "big")
+
 def lorawan_frmp_encryption(key, msg, devaddr, msg_dir, fcnt):
     """
     LoRaWAN FRM Payload encoder/decoder in AES128-CCM-STAR.
@@ -29,42 +51,14 @@ def lorawan_frmp_encryption(key, msg, devaddr, msg_dir, fcnt):
     - LoRaMacPayloadEncrypt() in Lora-net/LoRaMac-node.
         https://github.com/Lora-net/LoRaMac-node/blob/master/src/mac/LoRaMacCrypto.c#L108
     """
-    Ai = bytearray(16)
-    Ai[0] = 0x01
-    Ai[5] = msg_dir
-    # put both devaddr and fcnt in little endian.
-    Ai[6] = devaddr[3]
-    Ai[7] = devaddr[2]
-    Ai[8] = devaddr[1]
-    Ai[9] = devaddr[0]
-    Ai[10] = fcnt[3]
-    Ai[11] = fcnt[2]
-    Ai[12] = fcnt[1]
-    Ai[13] = fcnt[0]
-
     size = len(msg)
-    buf = bytearray(size)
-    offset = 0
-    ctr = 1
-
-    cipher = AES_ECB(key)
-
-    while size >= 16:
-        Ai[15] = ctr & 0xff
-        ctr += 1
-        Si = cipher.encrypt(Ai)
-        for i in range(16):
-            buf[offset + i] = msg[offset + i] ^ Si[i]
-        size -= 16
-        offset += 16
-
-    if size > 0:
-        Ai[15] = ctr & 0xff
-        Si = cipher.encrypt(Ai)
-        for i in range(size):
-            buf[offset + i] = msg[offset + i] ^ Si[i]
-
-    return buf
+    if size == 0:
+        return bytearray()
+    S = __frmp_keystream(bytes(key), bytes(devaddr), bytes(fcnt), msg_dir,
+                         size)
+    # XOR the whole payload with the key stream at once.
+    buf = int.from_bytes(msg, "big") ^ S
+    return bytearray(buf.to_bytes(size, "big"))
 
 def lorawan_frmp_integrity(key, msg, devaddr, msg_dir, fcnt):
     """
@@ -116,16 +110,25 @@ def lorawan_aes128_cmac(key, msg):
         key, msg: in bytearray.
         return: 4 bytes MIC.
     """
-    #key = bytearray.fromhex(key_hex)
-    cmac = AES_CMAC(key)
-    #cmac = AES_CMAC(bytearray.fromhex(key_hex))
-    cmac.update(msg)
-    m = cmac.digest()
+    m = get_cmac_ctx(key).digest(msg)
     return {
             "mic": m[:4][::-1],
             "cmac": m
             }
 
+def lorawan_cipher_cache_info():
+    """
+    statistics of the caches of the AES ciphers and the CMAC subkeys
+    kept for each session key, and of the key streams of FRMPayload.
+        return: a dict of functools' CacheInfo, i.e. hits, misses,
+                maxsize and currsize.
+    """
+    return {
+            "aes_ecb": aes_ecb_cache_info(),
+            "aes_cmac": cmac_ctx_cache_info(),
+            "keystream": __frmp_keystream.cache_info(),
+            }
+
 def lorawan_get_keys(appkey, devnonce=None, appnonce=None, netid=None):
     """
     Generating LoRaWAN Keys for v1.0.x.
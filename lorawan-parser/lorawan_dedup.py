@@ -0,0 +1,84 @@
+# NOTE:
+#   the same frame can be received through several paths, e.g. the raw
+#   frame from YAGS and the uplink message from TTN.  they are merged by
+#   the 32-bit FCnt, so the FCnt of both paths must agree.  the 16-bit FCnt
+#   in a raw frame can be inferred correctly after the rollover only if
+#   FCntTracker knows the last 32-bit FCnt, e.g. given at the start or
+#   taken from the network server which sends the 32-bit FCnt.
+
+from collections import deque
+
+# the period in seconds to keep the frames for merging.
+DEFAULT_WINDOW = 600
+# the maximum number of the frames kept.
+DEFAULT_SIZE = 4096
+
+class DedupIndex():
+    """
+    find the record of a frame seen in the last window seconds by its key.
+    the records are kept in a dict to find them, and the keys in a ring
+    in the arrival order to evict the oldest ones.
+
+    e.g.
+        record = index.get(fcnt, now)
+        if record is None:
+            index.add(fcnt, { ... }, now)
+        else:
+            index.merged += 1
+            ... merge the frame into the record ...
+
+    window: the period in seconds to keep the records.
+    size: the maximum number of the records.
+    merged: the number of the frames merged, counted by the caller.
+    """
+    def __init__(self, window=DEFAULT_WINDOW, size=DEFAULT_SIZE):
+        self.window = window
+        self.size = size
+        self.records = {}
+        self.ring = deque()
+        self.merged = 0
+
+    def evict(self, now):
+        """
+        remove the records older than window, and the oldest records
+        over size.
+        """
+        while self.ring and (len(self.ring) > self.size or
+                             self.ring[0][0] <= now - self.window):
+            t, key = self.ring.popleft()
+            del self.records[key]
+
+    def get(self, key, now):
+        """
+        return the record of the key, or None if it's not seen in window.
+        """
+        self.evict(now)
+        return self.records.get(key)
+
+    def add(self, key, record, now):
+        """
+        add the record of a new key, which get() didn't find.
+        """
+        self.records[key] = record
+        self.ring.append((now, key))
+        self.evict(now)
+
+if __name__ == "__main__":
+    def check(title, ok):
+        print("{} {}".format("OK" if ok else "NG", title))
+    # merging.
+    index = DedupIndex(window=10, size=3)
+    index.add(65536, "first", 0)
+    check("found in window", index.get(65536, 5) == "first")
+    check("not found other key", index.get(0, 5) is None)
+    # window eviction.
+    check("found just before window", index.get(65536, 9.9) == "first")
+    check("evicted at window", index.get(65536, 10) is None)
+    check("removed from ring", not index.ring and not index.records)
+    # size eviction.
+    for fcnt in range(5):
+        index.add(fcnt, fcnt, 20)
+    check("kept last size", sorted(index.records) == [2, 3, 4])
+    check("evicted oldest", index.get(0, 20) is None and
+          index.get(1, 20) is None and index.get(2, 20) == 2)
+    check("ring matches records", [k for t,k in index.ring] == [2, 3, 4])
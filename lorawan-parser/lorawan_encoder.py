@@ -0,0 +1,101 @@
+from lorawan_cipher import lorawan_frmp_encryption
+from lorawan_cipher import lorawan_frmp_integrity
+from lorawan_parser import MSGDIR_UP, MSGDIR_DOWN
+from lorawan_parser import MTYPE_UNCONFIRMED_DATA_UP
+from lorawan_parser import MTYPE_UNCONFIRMED_DATA_DOWN
+from lorawan_parser import MTYPE_CONFIRMED_DATA_UP
+from lorawan_parser import MTYPE_CONFIRMED_DATA_DOWN
+
+# the maximum size of FOpts.
+FOPTS_MAX_SIZE = 15
+
+__mtype_msgdir = {
+    MTYPE_UNCONFIRMED_DATA_UP: MSGDIR_UP,
+    MTYPE_UNCONFIRMED_DATA_DOWN: MSGDIR_DOWN,
+    MTYPE_CONFIRMED_DATA_UP: MSGDIR_UP,
+    MTYPE_CONFIRMED_DATA_DOWN: MSGDIR_DOWN,
+    }
+
+def encode_data_frame(devaddr, fcnt, fport=None, payload=b"", fopts=b"",
+                      nwkskey=None, appskey=None,
+                      mtype=MTYPE_UNCONFIRMED_DATA_DOWN, fctrl=0):
+    """
+    build a data frame.
+        devaddr: DevAddr, 4 bytes in big endian as decode_frame() returns.
+        fcnt: 32-bit FCnt in int. the lower 16 bits are put in the frame.
+        fport: FPort in int, or None if the frame has no FRMPayload.
+        payload: FRMPayload to be encrypted, by NwkSKey if fport is 0,
+            otherwise by AppSKey.  MAC commands longer than FOpts can
+            carry are put here with fport 0.
+        fopts: MAC commands piggybacked in FOpts, up to 15 bytes.
+        nwkskey: NwkSKey for MIC, it must be specified.
+        mtype: one of MTYPE_*_DATA_* in lorawan_parser.
+        fctrl: FCtrl bits other than FOptsLen, e.g. 0x80 for ADR.
+        return: PHYPayload in bytearray.
+    it raises ValueError if the arguments can't make a valid frame.
+    """
+    msg_dir = __mtype_msgdir.get(mtype)
+    if msg_dir is None:
+        raise ValueError("mtype must be a data message, but {}."
+                         .format(mtype))
+    if len(fopts) > FOPTS_MAX_SIZE:
+        raise ValueError("FOpts must be up to {} bytes, but {}."
+                         .format(FOPTS_MAX_SIZE, len(fopts)))
+    if payload and fport is None:
+        raise ValueError("fport must be specified with payload.")
+    if fport == 0 and fopts:
+        raise ValueError("MAC commands can't be in both FOpts and FPort 0.")
+    if nwkskey is None:
+        raise ValueError("nwkskey must be specified for MIC.")
+    fcnt_x = (fcnt & 0xffffffff).to_bytes(4, "big")
+    # MHDR | FHDR
+    frame = bytearray([mtype << 5])
+    frame += devaddr[::-1]
+    frame.append((fctrl & 0xf0) | len(fopts))
+    frame += fcnt_x[:1:-1]
+    frame += fopts
+    # FPort | FRMPayload
+    if fport is not None:
+        frame.append(fport)
+        if payload:
+            key = nwkskey if fport == 0 else appskey
+            if key is None:
+                raise ValueError("appskey must be specified for FPort {}."
+                                 .format(fport))
+            frame += lorawan_frmp_encryption(key, payload, devaddr=devaddr,
+                                             msg_dir=msg_dir, fcnt=fcnt_x)
+    # MIC
+    mic_o = lorawan_frmp_integrity(nwkskey, frame, devaddr=devaddr,
+                                   msg_dir=msg_dir, fcnt=fcnt_x)
+    frame += mic_o["cmac"][:4]
+    return frame
+
+if __name__ == "__main__":
+    from lorawan_a2b_hex import a2b_hex
+    from lorawan_parser import decode_frame
+    nwkskey = a2b_hex("70ff6652c80bcee90b21f2d74bf336b2")
+    appskey = a2b_hex("51ebd6666d77121b3782ef59a252e013")
+    devaddr = a2b_hex("2bbe0934")
+    # the frame in README.md
+    frame = encode_data_frame(devaddr, 0, fport=2,
+                              payload=a2b_hex("8105000a14033e0000000000000e7e09420a8c0000"),
+                              nwkskey=nwkskey, appskey=appskey,
+                              mtype=MTYPE_UNCONFIRMED_DATA_UP, fctrl=0x80)
+    expected = "403409be2b80000002c7fb8963476d5bf4090e6b867a40b597047241eb80aef79df6"
+    print("OK" if frame.hex() == expected else "NG", frame.hex())
+    # MAC commands in FOpts, and longer ones in FRMPayload of FPort 0.
+    test_list = [
+        { "fopts": a2b_hex("0307050707") },
+        { "fport": 0, "payload": a2b_hex("91" + "00100a"*20) },
+        { "fport": 1, "payload": a2b_hex("9000100a0005"),
+         "fopts": a2b_hex("0307") },
+        ]
+    for fcnt,kwargs in enumerate(test_list, start=65535):
+        frame = encode_data_frame(devaddr, fcnt, nwkskey=nwkskey,
+                                  appskey=appskey, **kwargs)
+        f = decode_frame(frame, nwkskey=nwkskey, appskey=appskey,
+                         upper_fcnt=(fcnt >> 16).to_bytes(2, "big"))
+        ok = (f.mic_ok and f.fcnt == fcnt and f.devaddr == devaddr and
+              f.fport == kwargs.get("fport") and
+              (f.payload or b"") == kwargs.get("payload", b""))
+        print("OK" if ok else "NG", frame.hex())
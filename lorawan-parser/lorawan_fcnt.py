@@ -0,0 +1,120 @@
+# NOTE:
+#   the frame carries only the lower 16 bits of the 32-bit FCnt.
+#   the upper 16 bits are needed to decrypt FRMPayload and to check MIC,
+#   and must be inferred from the FCnt of the frames received before.
+
+# the maximum gap of FCnt between the last accepted frame and a new frame,
+# which is MAX_FCNT_GAP in LoRaWAN v1.0.
+DEFAULT_FCNT_GAP = 16384
+# the number of the later 65536 FCnt epochs tried by candidates(),
+# in case more than gap frames have been lost.
+DEFAULT_RESYNC_EPOCHS = 2
+
+class FCntTracker():
+    """
+    reconstruct the 32-bit FCnt of each device.
+    a new 16-bit FCnt is taken as the next of the last accepted FCnt
+    if it's ahead within gap, taking the rollover into account.
+    otherwise, it's taken as an older frame, e.g. a duplicate.
+
+    e.g.
+        fcnt = tracker.infer(devaddr, fcnt16)
+        ... decrypt the frame with upper_fcnt(fcnt) and check it ...
+        tracker.accept(devaddr, fcnt)
+
+    devaddr: any hashable key of the device, e.g. DevAddr in bytes.
+    gap: the maximum gap of FCnt.
+    """
+    def __init__(self, gap=DEFAULT_FCNT_GAP):
+        self.gap = gap
+        self.last = {}
+
+    def infer(self, devaddr, fcnt16):
+        """
+        fcnt16: FCnt in the frame in int.
+        return: the 32-bit FCnt in int.
+        """
+        last = self.last.get(devaddr)
+        if last is None:
+            return fcnt16
+        ahead = (fcnt16 - last) & 0xffff
+        if ahead <= self.gap:
+            return (last + ahead) & 0xffffffff
+        behind = (last - fcnt16) & 0xffff
+        return last - behind if last >= behind else fcnt16
+
+    def candidates(self, devaddr, fcnt16, epochs=DEFAULT_RESYNC_EPOCHS):
+        """
+        fcnt16: FCnt in the frame in int.
+        return: a list of the 32-bit FCnts in int to be tried in the order.
+        the first one is infer(). the rest are the FCnts ahead of the last
+        accepted one beyond gap, up to epochs rollovers later, for the case
+        that more than gap frames have been lost.
+        it's only useful if the MIC is checked.  the first FCnt of which
+        MIC is verified is taken, and must be passed to accept().
+        """
+        fcnt = self.infer(devaddr, fcnt16)
+        last = self.last.get(devaddr)
+        ahead = fcnt16 if last is None else last + ((fcnt16 - last) & 0xffff)
+        ret = [fcnt]
+        for i in range(epochs + 1):
+            c = ahead + (i << 16)
+            if c <= 0xffffffff and c not in ret:
+                ret.append(c)
+        return ret
+
+    def accept(self, devaddr, fcnt):
+        """
+        record the 32-bit FCnt of a frame which has been accepted.
+        an older FCnt than the last one is ignored.
+        """
+        if fcnt > self.last.get(devaddr, -1):
+            self.last[devaddr] = fcnt
+
+def upper_fcnt(fcnt):
+    """
+    return the upper 16 bits of the 32-bit FCnt in bytes
+    to be passed to decode_frame().
+    """
+    return (fcnt >> 16).to_bytes(2, "big")
+
+if __name__ == "__main__":
+    tracker = FCntTracker(gap=100)
+    test_list = [
+        # (last accepted, FCnt in the frame, expected)
+        (None, 5, 5),
+        (5, 6, 6),
+        (5, 5, 5),
+        (5, 3, 3),
+        (65530, 2, 65538),
+        (65538, 65535, 65535),
+        (131070, 10, 131082),
+        (1000, 900, 900),
+        (10, 60000, 60000),
+        ]
+    for last, fcnt16, expected in test_list:
+        tracker.last = {} if last is None else { b"dev": last }
+        fcnt = tracker.infer(b"dev", fcnt16)
+        print("{} last={} fcnt16={} => {} upper={}".format(
+              "OK" if fcnt == expected else "NG", last, fcnt16, fcnt,
+              upper_fcnt(fcnt).hex()))
+    # more than gap frames are lost. infer() takes them as older frames,
+    # and the real FCnt is found in candidates() by the MIC check.
+    test_list = [
+        # (last accepted, real FCnt of the frame)
+        (1000, 1000 + 101),
+        (1000, 1000 + 30000),
+        (65530, 65530 + 306),
+        (65530, 65530 + 65536 + 306),
+        (None, 65536*2 + 7),
+        ]
+    for last, real in test_list:
+        tracker.last = {} if last is None else { b"dev": last }
+        c = tracker.candidates(b"dev", real & 0xffff)
+        ok = real in c and c[0] == tracker.infer(b"dev", real & 0xffff)
+        # e.g. the MIC is verified only with the real FCnt.
+        fcnt = next(f for f in c if f == real)
+        tracker.accept(b"dev", fcnt)
+        ok = ok and tracker.infer(b"dev", (real + 1) & 0xffff) == real + 1
+        print("{} last={} real={} => candidates {}".format(
+              "OK" if ok else "NG", last, real, c))
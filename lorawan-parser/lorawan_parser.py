@@ -1,13 +1,10 @@
-import sys
-import re
-import argparse
-import binascii
 from lorawan_cipher import lorawan_aes128_cmac
 from lorawan_cipher import lorawan_aes128_encrypt
 from lorawan_cipher import lorawan_frmp_encryption
 from lorawan_cipher import lorawan_frmp_integrity
 from lorawan_a2b_hex import a2b_hex
-import textwrap
+import struct
+from collections import namedtuple
 
 # NOTE:
 #   In LoRaWAN, the network byte order is little endian.
@@ -29,9 +26,24 @@ MSGDIR_DOWN = 1
 MSGDIR_UP = 0
 MSGDIR_UNKNOWN = 99
 __MIC_SIZE = 4
-
+__MHDR_SIZE = 1
+__JOIN_REQUEST_SIZE = 23
+__JOIN_ACCEPT_SIZES = ( 17, 33 )
+
+# MType in the 3 most significant bits of MHDR.
+MTYPE_JOIN_REQUEST = 0b000
+MTYPE_JOIN_ACCEPT = 0b001
+MTYPE_UNCONFIRMED_DATA_UP = 0b010
+MTYPE_UNCONFIRMED_DATA_DOWN = 0b011
+MTYPE_CONFIRMED_DATA_UP = 0b100
+MTYPE_CONFIRMED_DATA_DOWN = 0b101
+MTYPE_RFU = 0b110
+MTYPE_PROPRIETARY = 0b111
+MTYPE_DATA = ( MTYPE_UNCONFIRMED_DATA_UP, MTYPE_UNCONFIRMED_DATA_DOWN,
+               MTYPE_CONFIRMED_DATA_UP, MTYPE_CONFIRMED_DATA_DOWN )
+
+# options for the printers. the decoders don't refer to it.
 opt = type("DEFAULT_OPTION",(object,),{"debug_level":0, "verbose":False})
-__parse_only = False
 
 #====
 
@@ -94,6 +106,7 @@ def print_detail(text):
     indent = 10
     bullet = "* DETAIL:"
     bullet_len = 1 + len(bullet)
+    import textwrap
     print(textwrap.fill(text, width=75,
                         initial_indent="{}{}".format(" "*indent, bullet),
                         subsequent_indent="{}".format(" "*(indent+bullet_len))))
@@ -105,8 +118,6 @@ def print_vt(tag, v_wire=None, v_bits=None, indent=0):
         v_wire: string or None, usually wire format in bytes.
         v_bits: string or None, usually bits.
     """
-    if __parse_only is True:
-        return
     bullet = " "*(2*indent) + "#"*(2+indent)
     print("{} {}".format(bullet, tag), end="")
     if v_wire not in ["", None]:
@@ -123,8 +134,6 @@ def print_v(tag, v_host=None, v_wire=None, indent=1, debug=False):
         v_wire: string in the wire, or None.
         indent: 1, 2, or 3
     """
-    if __parse_only is True:
-        return
     if debug and opt.debug_level == 0:
         # ignore print_d() when the -d option is not specified.
         return
@@ -768,194 +777,214 @@ Table for MAC Command Parser
     name: MAC command name
     size: command size in octet.
     parser: function name.
+the table is made by get_mac_cmd_tab() when it's needed first.
 """
-mac_cmd_tab = {
-    # Class A Mac Command
-    0x01: {
-        MSGDIR_UP: {
-            "name": "ResetInd",
-            "size": 1,
-            "parser": parse_maccmd_ResetInd
-        },
-        MSGDIR_DOWN: {
-            "name": "ResetConf",
-            "size": 1,
-            "parser": parse_maccmd_ResetConf
-        }
-    },
-    0x02: {
-        MSGDIR_UP: {
-            "name": "LinkCheckReq",
-            "size": 0,
-            "parser": parse_maccmd_LinkCheckReq
+def _make_mac_cmd_tab():
+    return {
+        # Class A Mac Command
+        0x01: {
+            MSGDIR_UP: {
+                "name": "ResetInd",
+                "size": 1,
+                "parser": parse_maccmd_ResetInd
+            },
+            MSGDIR_DOWN: {
+                "name": "ResetConf",
+                "size": 1,
+                "parser": parse_maccmd_ResetConf
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "LinkCheckAns",
-            "size": 2,
-            "parser": parse_maccmd_LinkCheckAns
-        }
-    },
-    0x03: {
-        MSGDIR_UP: {
-            "name": "LinkADRAns",
-            "size": 1,
-            "parser": parse_maccmd_LinkADRAns
+        0x02: {
+            MSGDIR_UP: {
+                "name": "LinkCheckReq",
+                "size": 0,
+                "parser": parse_maccmd_LinkCheckReq
+            },
+            MSGDIR_DOWN: {
+                "name": "LinkCheckAns",
+                "size": 2,
+                "parser": parse_maccmd_LinkCheckAns
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "LinkADRReq",
-            "size": 4,
-            "parser": parse_maccmd_LinkADRReq
-        }
-    },
-    0x04: {
-        MSGDIR_UP: {
-            "name": "DutyCycleAns",
-            "size": 0,
-            "parser": parse_maccmd_DutyCycleAns
+        0x03: {
+            MSGDIR_UP: {
+                "name": "LinkADRAns",
+                "size": 1,
+                "parser": parse_maccmd_LinkADRAns
+            },
+            MSGDIR_DOWN: {
+                "name": "LinkADRReq",
+                "size": 4,
+                "parser": parse_maccmd_LinkADRReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "DutyCycleReq",
-            "size": 1,
-            "parser": parse_maccmd_DutyCycleReq
-        }
-    },
-    0x05: {
-        MSGDIR_UP: {
-            "name": "RXParamSetupAns",
-            "size": 1,
-            "parser": parse_maccmd_RXParamSetupAns
+        0x04: {
+            MSGDIR_UP: {
+                "name": "DutyCycleAns",
+                "size": 0,
+                "parser": parse_maccmd_DutyCycleAns
+            },
+            MSGDIR_DOWN: {
+                "name": "DutyCycleReq",
+                "size": 1,
+                "parser": parse_maccmd_DutyCycleReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "RXParamSetupReq",
-            "size": 4,
-            "parser": parse_maccmd_RXParamSetupReq
-        }
-    },
-    0x06: {
-        MSGDIR_UP: {
-            "name": "DevStatusAns",
-            "size": 2,
-            "parser": parse_maccmd_DevStatusAns
+        0x05: {
+            MSGDIR_UP: {
+                "name": "RXParamSetupAns",
+                "size": 1,
+                "parser": parse_maccmd_RXParamSetupAns
+            },
+            MSGDIR_DOWN: {
+                "name": "RXParamSetupReq",
+                "size": 4,
+                "parser": parse_maccmd_RXParamSetupReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "DevStatusReq",
-            "size": 0,
-            "parser": parse_maccmd_DevStatusReq
-        }
-    },
-    0x07: {
-        MSGDIR_UP: {
-            "name": "NewChannelAns",
-            "size": 1,
-            "parser": parse_maccmd_NewChannelAns
+        0x06: {
+            MSGDIR_UP: {
+                "name": "DevStatusAns",
+                "size": 2,
+                "parser": parse_maccmd_DevStatusAns
+            },
+            MSGDIR_DOWN: {
+                "name": "DevStatusReq",
+                "size": 0,
+                "parser": parse_maccmd_DevStatusReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "NewChannelReq",
-            "size": 5,
-            "parser": parse_maccmd_NewChannelReq
-        }
-    },
-    0x08: {
-        MSGDIR_UP: {
-            "name": "RXTimingSetupAns",
-            "size": 0,
-            "parser": parse_maccmd_RXTimingSetupAns
+        0x07: {
+            MSGDIR_UP: {
+                "name": "NewChannelAns",
+                "size": 1,
+                "parser": parse_maccmd_NewChannelAns
+            },
+            MSGDIR_DOWN: {
+                "name": "NewChannelReq",
+                "size": 5,
+                "parser": parse_maccmd_NewChannelReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "RXTimingSetupReq",
-            "size": 1,
-            "parser": parse_maccmd_RXTimingSetupReq
-        }
-    },
-    0x09: {
-        MSGDIR_UP: {
-            "name": "TxParamSetupAns",
-            "size": 0,
-            "parser": parse_maccmd_TxParamSetupAns
+        0x08: {
+            MSGDIR_UP: {
+                "name": "RXTimingSetupAns",
+                "size": 0,
+                "parser": parse_maccmd_RXTimingSetupAns
+            },
+            MSGDIR_DOWN: {
+                "name": "RXTimingSetupReq",
+                "size": 1,
+                "parser": parse_maccmd_RXTimingSetupReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "TxParamSetupReq",
-            "size": 1,
-            "parser": parse_maccmd_TxParamSetupReq
-        }
-    },
-    0x0a: {
-        MSGDIR_UP: {
-            "name": "DlChannelAns",
-            "size": 1,
-            "parser": parse_maccmd_DlChannelAns
+        0x09: {
+            MSGDIR_UP: {
+                "name": "TxParamSetupAns",
+                "size": 0,
+                "parser": parse_maccmd_TxParamSetupAns
+            },
+            MSGDIR_DOWN: {
+                "name": "TxParamSetupReq",
+                "size": 1,
+                "parser": parse_maccmd_TxParamSetupReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "DlChannelReq",
-            "size": 4,
-            "parser": parse_maccmd_DlChannelReq
-        }
-    },
-    # Class B Mac Command
-    0x10: {
-        MSGDIR_UP: {
-            "name": "PingSlotInfoReq",
-            "size": 1,
-            "parser": parse_maccmd_PingSlotInfoReq
+        0x0a: {
+            MSGDIR_UP: {
+                "name": "DlChannelAns",
+                "size": 1,
+                "parser": parse_maccmd_DlChannelAns
+            },
+            MSGDIR_DOWN: {
+                "name": "DlChannelReq",
+                "size": 4,
+                "parser": parse_maccmd_DlChannelReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "PingSlotInfoAns",
-            "size": 0,
-            "parser": parse_maccmd_PingSlotInfoAns
-        }
-    },
-    0x11: {
-        MSGDIR_UP: {
-            "name": "PingSlotChannelAns",
-            "size": 4,
-            "parser": parse_maccmd_PingSlotChannelAns
+        # Class B Mac Command
+        0x10: {
+            MSGDIR_UP: {
+                "name": "PingSlotInfoReq",
+                "size": 1,
+                "parser": parse_maccmd_PingSlotInfoReq
+            },
+            MSGDIR_DOWN: {
+                "name": "PingSlotInfoAns",
+                "size": 0,
+                "parser": parse_maccmd_PingSlotInfoAns
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "PingSlotChannelReq",
-            "size": 4,
-            "parser": parse_maccmd_PingSlotChannelReq
-        }
-    },
-    0x12: {
-        MSGDIR_UP: {
-            "name": "BeaconTimingReq",
-            "size": 0,
-            "parser": parse_maccmd_BeaconTimingReq
+        0x11: {
+            MSGDIR_UP: {
+                "name": "PingSlotChannelAns",
+                "size": 1,
+                "parser": parse_maccmd_PingSlotChannelAns
+            },
+            MSGDIR_DOWN: {
+                "name": "PingSlotChannelReq",
+                "size": 4,
+                "parser": parse_maccmd_PingSlotChannelReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "BeaconTimingAns",
-            "size": 3,
-            "parser": parse_maccmd_BeaconTimingAns
-        }
-    },
-    0x13: {
-        MSGDIR_UP: {
-            "name": "BeaconFreqAns",
-            "size": 1,
-            "parser": parse_maccmd_BeaconFreqAns
+        0x12: {
+            MSGDIR_UP: {
+                "name": "BeaconTimingReq",
+                "size": 0,
+                "parser": parse_maccmd_BeaconTimingReq
+            },
+            MSGDIR_DOWN: {
+                "name": "BeaconTimingAns",
+                "size": 3,
+                "parser": parse_maccmd_BeaconTimingAns
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "BeaconFreqReq",
-            "size": 3,
-            "parser": parse_maccmd_BeaconFreqReq
-        }
-    },
-    # Class C Mac Command
-    0x20: {
-        MSGDIR_UP: {
-            "name": "DeviceModeInd",
-            "size": 1,
-            "parser": parse_maccmd_DeviceModeInd
+        0x13: {
+            MSGDIR_UP: {
+                "name": "BeaconFreqAns",
+                "size": 1,
+                "parser": parse_maccmd_BeaconFreqAns
+            },
+            MSGDIR_DOWN: {
+                "name": "BeaconFreqReq",
+                "size": 3,
+                "parser": parse_maccmd_BeaconFreqReq
+            }
         },
-        MSGDIR_DOWN: {
-            "name": "DeviceModeConf",
-            "size": 1,
-            "parser": parse_maccmd_DeviceModeConf
+        # Class C Mac Command
+        0x20: {
+            MSGDIR_UP: {
+                "name": "DeviceModeInd",
+                "size": 1,
+                "parser": parse_maccmd_DeviceModeInd
+            },
+            MSGDIR_DOWN: {
+                "name": "DeviceModeConf",
+                "size": 1,
+                "parser": parse_maccmd_DeviceModeConf
+            }
         }
     }
-    }
 
-def parse_mac_cmd(mac_cmds, msg_dir, version):
+_mac_cmd_tab = None
+
+def get_mac_cmd_tab():
+    """
+    return the table for MAC Command Parser.
+    """
+    global _mac_cmd_tab
+    if _mac_cmd_tab is None:
+        _mac_cmd_tab = _make_mac_cmd_tab()
+    return _mac_cmd_tab
+
+def __getattr__(name):
+    # mac_cmd_tab used to be a module global.
+    if name == "mac_cmd_tab":
+        return get_mac_cmd_tab()
+    raise AttributeError("module {!r} has no attribute {!r}"
+                         .format(__name__, name))
+
+def print_mac_cmd(mac_cmds, msg_dir, version):
     offset = 0
     n_cmd = 0
     dir_str = "Up" if msg_dir == 0 else "Down"
@@ -963,6 +992,7 @@ def parse_mac_cmd(mac_cmds, msg_dir, version):
         print_vt("MAC Command (No. CMD CID DIR [MSG])")
     else:
         print_vt("MAC Command (No. CMD CID DIR)")
+    mac_cmd_tab = get_mac_cmd_tab()
     while offset < len(mac_cmds):
         cid = mac_cmds[offset]
         a = mac_cmd_tab.get(cid)
@@ -987,17 +1017,234 @@ def parse_mac_cmd(mac_cmds, msg_dir, version):
             # just stop to parse all.
             return
 
+#====
+#
+# Decoders
+#   they never print anything and never refer to the module global opt,
+#   so that they can be called from multiple threads.
+#   each decoder returns a dict of which fields are printed by print_*().
+#
+
+# bit strings of a byte, e.g. _BITS8[5] == "00000101"
+_BITS8 = tuple(format(i, "08b") for i in range(256))
+
+class HeaderDict(dict):
+    """
+    a dict of header fields which are decoded into int.
+    the bit string fields like "mhdr_bits" are computed from the int fields
+    when they are referred first, so that the decoders don't have to make
+    strings for each frame.
+        lazy: { key: function(header_dict) } of such fields.
+    """
+    __slots__ = ()
+    lazy = {}
+
+    def __missing__(self, key):
+        func = self.lazy.get(key)
+        if func is None:
+            raise KeyError(key)
+        v = self[key] = func(self)
+        return v
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.lazy
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+class MHDRDict(HeaderDict):
+    __slots__ = ()
+    lazy = {
+            "mhdr_bits": lambda o: _BITS8[o["mhdr"]],
+            "mtype": lambda o: _BITS8[o["mtype_i"]][5:],
+            "major": lambda o: _BITS8[o["major_i"]][6:],
+            }
+
+class FCtrlDict(HeaderDict):
+    __slots__ = ()
+    lazy = {
+            "fctrl_bits": lambda o: _BITS8[o["fctrl"]],
+            }
+
+def _mhdr_entry(mhdr):
+    mtype_i = mhdr >> 5
+    if mtype_i in [ MTYPE_JOIN_REQUEST, MTYPE_UNCONFIRMED_DATA_UP,
+                   MTYPE_CONFIRMED_DATA_UP ]:
+        msg_dir = MSGDIR_UP
+    elif mtype_i in [ MTYPE_JOIN_ACCEPT, MTYPE_UNCONFIRMED_DATA_DOWN,
+                     MTYPE_CONFIRMED_DATA_DOWN ]:
+        msg_dir = MSGDIR_DOWN
+    else:
+        msg_dir = MSGDIR_UNKNOWN
+    return {
+            "mhdr": mhdr,
+            "mtype_i": mtype_i,
+            "mtype_cmd": [ "Join Request", "Join Accept",
+                          "Unconfirmed Data Up", "Unconfirmed Data Down",
+                          "Confirmed Data Up", "Confirmed Data Down",
+                          "RFU", "Proprietary" ][mtype_i],
+            "major_i": mhdr & 0x03,
+            "msg_dir": msg_dir,
+            }
+
+# the result of parse_mhdr() for each MHDR value.
+_MHDR_TABLE = tuple(_mhdr_entry(i) for i in range(256))
+
+# DevAddr, FCtrl and FCnt at the head of FHDR.
+_FHDR_STRUCT = struct.Struct("<IBH")
+
+"""
+Layouts for the MAC Command decoder
+    { (CID, direction): (struct format, fields) }
+    each field is (name, index, shift, mask, signed).
+        index: the index of the value unpacked by the struct format.
+            a tuple of 2 indexes is for a 24-bit value unpacked by "HB".
+        shift, mask: the field is (value >> shift) & mask.
+        signed: True if the field is a two's complement.
+    the fields are in int as it is in the frame,
+    e.g. Frequency is in 100 Hz, and MaxEIRP is an index of the table.
+    the size of the format must be same as the size in mac_cmd_tab.
+"""
+_mac_cmd_layout_tab = {
+    # Class A Mac Command
+    (0x01, MSGDIR_UP): ("<B", [("Minor", 0, 0, 0x0f, False)]),
+    (0x01, MSGDIR_DOWN): ("<B", [("Minor", 0, 0, 0x0f, False)]),
+    (0x02, MSGDIR_UP): ("<", []),
+    (0x02, MSGDIR_DOWN): ("<BB", [("Margin", 0, 0, 0xff, False),
+                                  ("GwCnt", 1, 0, 0xff, False)]),
+    (0x03, MSGDIR_UP): ("<B", [("PowerACK", 0, 2, 1, False),
+                               ("DataRateACK", 0, 1, 1, False),
+                               ("ChannelMaskACK", 0, 0, 1, False)]),
+    (0x03, MSGDIR_DOWN): ("<BHB", [("DataRate", 0, 4, 0x0f, False),
+                                   ("TXPower", 0, 0, 0x0f, False),
+                                   ("ChMask", 1, 0, 0xffff, False),
+                                   ("ChMaskCntl", 2, 4, 0x07, False),
+                                   ("NbTrans", 2, 0, 0x0f, False)]),
+    (0x04, MSGDIR_UP): ("<", []),
+    (0x04, MSGDIR_DOWN): ("<B", [("MaxDCycle", 0, 0, 0x0f, False)]),
+    (0x05, MSGDIR_UP): ("<B", [("RX1DRoffsetACK", 0, 2, 1, False),
+                               ("RX2DataRateACK", 0, 1, 1, False),
+                               ("ChannelACK", 0, 0, 1, False)]),
+    (0x05, MSGDIR_DOWN): ("<BHB", [("RX1DRoffset", 0, 4, 0x07, False),
+                                   ("RX2DataRate", 0, 0, 0x0f, False),
+                                   ("Frequency", (1,2), 0, 0xffffff, False)]),
+    (0x06, MSGDIR_UP): ("<BB", [("Battery", 0, 0, 0xff, False),
+                                ("Margin", 1, 0, 0x3f, True)]),
+    (0x06, MSGDIR_DOWN): ("<", []),
+    (0x07, MSGDIR_UP): ("<B", [("DataRateRangeOk", 0, 1, 1, False),
+                               ("ChannelFrequencyOk", 0, 0, 1, False)]),
+    (0x07, MSGDIR_DOWN): ("<BHBB", [("ChIndex", 0, 0, 0xff, False),
+                                    ("Frequency", (1,2), 0, 0xffffff, False),
+                                    ("MaxDR", 3, 4, 0x0f, False),
+                                    ("MinDR", 3, 0, 0x0f, False)]),
+    (0x08, MSGDIR_UP): ("<", []),
+    (0x08, MSGDIR_DOWN): ("<B", [("Delay", 0, 0, 0x0f, False)]),
+    (0x09, MSGDIR_UP): ("<", []),
+    (0x09, MSGDIR_DOWN): ("<B", [("DownlinkDwellTime", 0, 5, 1, False),
+                                 ("UplinkDwellTime", 0, 4, 1, False),
+                                 ("MaxEIRP", 0, 0, 0x0f, False)]),
+    (0x0a, MSGDIR_UP): ("<B", [("UplinkFrequencyExists", 0, 1, 1, False),
+                               ("ChannelFrequencyOk", 0, 0, 1, False)]),
+    (0x0a, MSGDIR_DOWN): ("<BHB", [("ChIndex", 0, 0, 0xff, False),
+                                   ("Frequency", (1,2), 0, 0xffffff, False)]),
+    # Class B Mac Command
+    (0x10, MSGDIR_UP): ("<B", [("Periodicity", 0, 0, 0x07, False)]),
+    (0x10, MSGDIR_DOWN): ("<", []),
+    (0x11, MSGDIR_UP): ("<B", [("DataRateOk", 0, 1, 1, False),
+                               ("ChannelFrequencyOk", 0, 0, 1, False)]),
+    (0x11, MSGDIR_DOWN): ("<HBB", [("Frequency", (0,1), 0, 0xffffff, False),
+                                   ("DataRate", 2, 0, 0x0f, False)]),
+    (0x12, MSGDIR_UP): ("<", []),
+    (0x12, MSGDIR_DOWN): ("<HB", [("Delay", 0, 0, 0xffff, False),
+                                  ("Channel", 1, 0, 0xff, False)]),
+    (0x13, MSGDIR_UP): ("<B", [("BeaconFrequencyOk", 0, 0, 1, False)]),
+    (0x13, MSGDIR_DOWN): ("<HB", [("Frequency", (0,1), 0, 0xffffff, False)]),
+    # Class C Mac Command
+    (0x20, MSGDIR_UP): ("<B", [("Class", 0, 0, 0xff, False)]),
+    (0x20, MSGDIR_DOWN): ("<B", [("Class", 0, 0, 0xff, False)]),
+    }
+
+"""
+Result of decode_mac_cmds()
+    cid: CID in int.
+    name: MAC command name, e.g. "LinkADRReq".
+    fields: a named tuple of the fields in int, named by the name of
+        the command.  it's an empty tuple if the command has no field.
+"""
+MACCommand = namedtuple("MACCommand", [ "cid", "name", "fields" ])
+
+def _compile_mac_cmd_layout(cid, msg_dir, form, fields):
+    mac_cmd_tab = get_mac_cmd_tab()
+    name = mac_cmd_tab[cid][msg_dir]["name"]
+    st = struct.Struct(form)
+    if st.size != mac_cmd_tab[cid][msg_dir]["size"]:
+        raise ValueError("size of the layout of {} is not matched."
+                         .format(name))
+    return (name, st, namedtuple(name, [f[0] for f in fields]), fields)
+
+# the compiled layouts, { (CID, direction): (name, struct, record, fields) }
+# they are compiled when decode_mac_cmds() is called first.  two threads
+# may compile them at once, but both results are same.
+_mac_cmd_layouts = None
+
+def _get_mac_cmd_layouts():
+    global _mac_cmd_layouts
+    if _mac_cmd_layouts is None:
+        _mac_cmd_layouts = { k:_compile_mac_cmd_layout(*k, *v)
+                            for k,v in _mac_cmd_layout_tab.items() }
+    return _mac_cmd_layouts
+
+def decode_mac_cmds(mac_cmds, msg_dir):
+    """
+    MAC Command decoder
+        mac_cmds: FOpts, or FRMPayload of FPort 0 in bytes.
+        msg_dir: MSGDIR_UP or MSGDIR_DOWN.
+        return: a list of MACCommand.
+    it stops at an unknown CID, because the size of the rest can't be known.
+    it raises ValueError if a command is truncated.
+    """
+    layouts = _get_mac_cmd_layouts()
+    ret = []
+    offset = 0
+    size = len(mac_cmds)
+    while offset < size:
+        cid = mac_cmds[offset]
+        layout = layouts.get((cid, msg_dir))
+        if layout is None:
+            break
+        name, st, record, fields = layout
+        offset += 1
+        if offset + st.size > size:
+            raise ValueError("MAC command {} needs {} bytes, but {}."
+                             .format(name, st.size, size - offset))
+        u = st.unpack_from(mac_cmds, offset)
+        offset += st.size
+        values = []
+        for _, index, shift, mask, signed in fields:
+            if isinstance(index, tuple):
+                v = u[index[0]] | (u[index[1]] << 16)
+            else:
+                v = (u[index] >> shift) & mask
+            if signed and v > (mask >> 1):
+                v -= mask + 1
+            values.append(v)
+        ret.append(MACCommand(cid, name, record._make(values)))
+    return ret
+
+
 def parse_fhdr(payload, msg_dir, version, upper_fcnt=b"\x00\x00"):
     """
     FHDR Parser.
-    - payload: mac payload (MHDR is not included) in bytes.
+    - payload: mac payload (MHDR is not included) in bytes or memoryview.
     - FHDR format is:
            4    |   1   |   2  | 0...15
         DevAddr | FCtrl | FCnt | FOpts
     """
-    devaddr = payload[0:4][::-1]
-    fctrl_x = payload[4:5]
-    fcnt_x = payload[5:7][::-1]
+    if len(payload) < 7:
+        raise ValueError("FHDR must need 7 bytes at least.")
+    devaddr_i, fctrl_i, fcnt_i = _FHDR_STRUCT.unpack_from(payload)
+    devaddr = devaddr_i.to_bytes(4, "big")
+    fcnt_x = fcnt_i.to_bytes(2, "big")
     """
     FCtrl
         - FCtrl for downlink
@@ -1009,95 +1256,56 @@ def parse_fhdr(payload, msg_dir, version, upper_fcnt=b"\x00\x00"):
             v1.0    ADR | ADRACKReq | ACK |   RFU    | FOptsLen
             v1.0.3  ADR | ADRACKReq | ACK |  ClassB  | FOptsLen
     """
-    fctrl_b = x2bin(fctrl_x)
-    foptslen_b = fctrl_b[4:]
-    foptslen_i = int(foptslen_b,2)
-    #
-    print_v("FHDR", formx(payload[0:7+foptslen_i]))
-    print_v("DevAddr", formx(devaddr), formx(devaddr[::-1]), indent=2)
-    print_v("FCtrl", formx(fctrl_x), formx(fctrl_b,"bin"), indent=2)
-    #
+    foptslen_i = fctrl_i & 0x0f
     if msg_dir == MSGDIR_DOWN:
-        adr_b = fctrl_b[0]
-        adrackreq_rfu_b = fctrl_b[1]
-        ack_b = fctrl_b[2]
-        fpending_b = fctrl_b[3]
-        #
-        print_v("ADR", formx(adr_b,"bin"), indent=3)
-        if version != "1.0":
-            print_v("ADRACKReq", formx(adrackreq_rfu_b,"bin"), indent=3)
-        else:
-            print_v("RFU", formx(adrackreq_rfu_b,"bin"), indent=3)
-        print_v("ACK", formx(ack_b,"bin"), indent=3)
-        print_v("FPending", formx(fpending_b,"bin"), indent=3)
-        print_v("FOptsLen", foptslen_i, formx(foptslen_b,"bin"), indent=3)
-        fctrl_o = {
-                "fctrl_bits": fctrl_b,
-                "adr": int(adr_b),
-                "ack": int(ack_b),
-                "fpending": int(fpending_b),
-                "foptslen": foptslen_i
-                }
+        fctrl_o = FCtrlDict(
+                fctrl=fctrl_i,
+                adr=fctrl_i >> 7,
+                ack=(fctrl_i >> 5) & 1,
+                fpending=(fctrl_i >> 4) & 1,
+                foptslen=foptslen_i)
     else:
-        adr_b = fctrl_b[0]
-        adrackreq_b = fctrl_b[1]
-        ack_b = fctrl_b[2]
-        classb_b = fctrl_b[3]
-        #
-        print_v("ADR", formx(adr_b,"bin"), indent=3)
-        print_v("ADRACKReq", formx(adrackreq_b,"bin"), indent=3)
-        print_v("ACK", formx(ack_b,"bin"), indent=3)
-        if version != "1.0":
-            print_v("RFU", formx(classb_b,"bin"), indent=3)
-        else:
-            print_v("ClassB", formx(classb_b,"bin"), indent=3)
-        print_v("FOptsLen", foptslen_i, formx(foptslen_b,"bin"), indent=3)
-        fctrl_o = {
-                "fctrl_bits": fctrl_b,
-                "adr": int(adr_b),
-                "adrackreq": int(adrackreq_b),
-                "ack": int(ack_b),
-                "classb": int(classb_b),
-                "foptslen": foptslen_i
-                }
+        fctrl_o = FCtrlDict(
+                fctrl=fctrl_i,
+                adr=fctrl_i >> 7,
+                adrackreq=(fctrl_i >> 6) & 1,
+                ack=(fctrl_i >> 5) & 1,
+                classb=(fctrl_i >> 4) & 1,
+                foptslen=foptslen_i)
     #
-    fcnt_i = x2int(fcnt_x[::-1]+upper_fcnt[::-1])
-    print_v("FCnt", fcnt_i, formx(upper_fcnt+fcnt_x), indent=2)
     if foptslen_i == 0:
-        fopts_o = None
+        fopts = None
         fhdr_size = 7
     else:
         # foptslen_i > 0
         fhdr_size = 7 + foptslen_i
-        mac_cmds = payload[7:fhdr_size]
-        print_v("FOpts", formx(mac_cmds), indent=2)
-        fopts_o = parse_mac_cmd(mac_cmds, msg_dir, version)
+        fopts = bytes(payload[7:fhdr_size])
     #
     return {
             "devaddr": devaddr,
             "fctrl": fctrl_o,
             "fcnt": upper_fcnt+fcnt_x,
-            "fopts": fopts_o,
+            "fopts": fopts,
             "fhdr_size": fhdr_size,
             }
 
 def parse_mac_payload(phy_pdu, mhdr_o, nwkskey=None, appskey=None,
-                      version="1.0.3", upper_fcnt=b"\x00\x00"):
+                      version="1.0.3", upper_fcnt=b"\x00\x00", partial=False):
     """
     MACPayload parser
     - phy_pdu: in bytearray.
+      it's read through memoryview, and only FOpts and the decrypted
+      FRMPayload are copied.
+    - partial: if True, FHDR shorter than 7 bytes is parsed as if it's
+      padded with zeros so that the printers can show what is in the frame.
+      otherwise, ValueError is raised.
     - MACPayload
         FHDR | FPort | FRMPayload
         or
         FHDR
     """
-    # set msg_dir
-    if mhdr_o["mtype"] in [ "000", "010", "100" ]:
-        msg_dir = MSGDIR_UP
-    elif mhdr_o["mtype"] in [ "001", "011", "101" ]:
-        msg_dir = MSGDIR_DOWN
-    else:
-        print_w("unknown msg direction")
+    msg_dir = mhdr_o["msg_dir"]
+    if msg_dir == MSGDIR_UNKNOWN:
         return { "msg_dir": MSGDIR_UNKNOWN }
     """
 ## FOptsLen, FOpts, FPort, FRMPayload
@@ -1136,10 +1344,16 @@ encrypted and must not exceed the maximum FRMPayload length.
     3) DevAddr | foptlen>0 | FCnt | FOpts | (nul) | (nul)
     4) DevAddr | foptlen>0 | FCnt | FOpts | != 0  | App. message
     """
-    payload = phy_pdu[1:-__MIC_SIZE]
-    fhdr_o = parse_fhdr(payload, msg_dir, version)
+    pdu_mv = memoryview(phy_pdu)
+    payload = pdu_mv[1:-__MIC_SIZE]
+    if partial and len(payload) < 7:
+        fhdr_o = parse_fhdr(bytes(payload).ljust(7, b"\x00"), msg_dir,
+                            version, upper_fcnt=upper_fcnt)
+    else:
+        fhdr_o = parse_fhdr(payload, msg_dir, version, upper_fcnt=upper_fcnt)
     # base object to be returned.
     ret_o = {
+            "msg_dir": msg_dir,
             "devaddr": fhdr_o["devaddr"],
             "fctrl": fhdr_o["fctrl"],
             "fcnt": fhdr_o["fcnt"],
@@ -1149,114 +1363,51 @@ encrypted and must not exceed the maximum FRMPayload length.
     # MIC calculation
     if nwkskey is not None:
         # mic_target is MHDR | FHDR | FPort | FRMPayload
-        mic_target = phy_pdu[0:-__MIC_SIZE]
-        print_d("NwkSKey", formx(nwkskey))
-        print_d("Data", formx(mic_target))
-        print_d("Data length", "{}".format(len(mic_target)))
-        print_d("DevAddr", formx(fhdr_o["devaddr"]))
-        print_d("Direction", msg_dir)
-        print_d("FCnt", formx(fhdr_o["fcnt"]))
-        mic_derived = lorawan_frmp_integrity(nwkskey, mic_target,
+        mic_derived = lorawan_frmp_integrity(nwkskey, pdu_mv[0:-__MIC_SIZE],
                                              devaddr=fhdr_o["devaddr"],
                                              msg_dir=msg_dir,
                                              fcnt=fhdr_o["fcnt"])
-        ret_o.update({"mic_derived": mic_derived["mic"]})
-        print_d("CMAC", formx(mic_derived["cmac"]))
-        print_d("MIC", formx(mic_derived["mic"]))
-    else:
-        print_w("not checked MIC due to no NwkSKey specified.")
-        mic_derived = None
+        ret_o.update({"mic_derived": mic_derived["mic"],
+                      "cmac_derived": mic_derived["cmac"]})
     #
     offset = fhdr_o["fhdr_size"]
     rest_size = len(payload) - offset
-    if rest_size < 0:
-        print_w("invalid fhdr_size={}, rest_size={}".format(fhdr_o["fhdr_size"],
-                                                            rest_size))
-        return ret_o
-    if rest_size == 0:
-        # case 3
+    if rest_size <= 0:
+        # case 3, or invalid fhdr_size.
         return ret_o
     # case 1,2,4
-    fport = payload[offset:offset+1]
-    fport_i = fport[0]
-    print_v("FPort", fport_i, formx(fport), indent=2)
+    fport_i = payload[offset]
     ret_o.update({ "fport": fport_i })
     #
     offset += 1
     rest_size -= 1
-    payload = payload[offset:]
     if rest_size <= 0:
-        print_w("payload size is too short. rest_size={}".format(rest_size))
         return ret_o
     # decrypting
     if fport_i == 0:
         # case 2
-        print_vt("FRMPayload(MAC Command)", formx(payload))
-        if fhdr_o["fctrl"]["foptslen"] > 0:
-            print_w("MAC Commands exist in both FOpts and FRMPayload.")
-            # thru
-        if nwkskey is not None:
-            print_d("NwkSKey", formx(nwkskey))
-            print_d("Data", formx(payload))
-            print_d("Data length", "{}".format(len(payload)))
-            print_d("DevAddr", formx(fhdr_o["devaddr"]))
-            print_d("Direction", msg_dir)
-            print_d("FCnt", formx(fhdr_o["fcnt"]))
-            payload = lorawan_frmp_encryption(nwkskey, payload,
-                                              devaddr=fhdr_o["devaddr"],
-                                              msg_dir=msg_dir,
-                                              fcnt=fhdr_o["fcnt"])
-            ret_o.update({ "payload": payload })
-            print_d("Decrypted", formx(payload))
-            print_v("MAC Commands", formx(payload))
-            frm_o = parse_mac_cmd(payload, msg_dir, version)
-            ret_o.update({ "frm_mac": frm_o })
-        else:
-            print_w("not decrypted MAC Command due to no NwkSKey specified.")
-        #
-        return ret_o
+        key = nwkskey
     else:
         # case 1,4
-        if fport_i == 224:
-            print_vt("FRMPayload (MAC Command Test)", formx(payload))
-        else:
-            print_vt("FRMPayload (Application Data)", formx(payload))
-        #
-        if appskey is not None:
-            print_d("AppSKey", formx(appskey))
-            print_d("Data", formx(payload))
-            print_d("Data length", "{}".format(len(payload)))
-            print_d("DevAddr", formx(fhdr_o["devaddr"]))
-            print_d("Direction", msg_dir)
-            print_d("FCnt", formx(fhdr_o["fcnt"]))
-            payload = lorawan_frmp_encryption(appskey, payload,
-                                              devaddr=fhdr_o["devaddr"],
-                                              msg_dir=msg_dir,
-                                              fcnt=fhdr_o["fcnt"])
-            ret_o.update({ "payload": payload })
-            print_d("Decrypted", formx(payload))
-            #
-            if fport_i == 224:
-                print_v("TestData", formx(payload))
-            else:
-                print_v("AppData", formx(payload))
-        else:
-            print_w("not decrypt Application Data due to no AppSKey specified.")
-        #
-        return ret_o
+        key = appskey
+    if key is not None:
+        payload = lorawan_frmp_encryption(key, payload[offset:],
+                                          devaddr=fhdr_o["devaddr"],
+                                          msg_dir=msg_dir,
+                                          fcnt=fhdr_o["fcnt"])
+        ret_o.update({ "payload": payload })
+    #
+    return ret_o
 
 def parse_netid(netid_x):
     """
     NetID parser.
         netid: 3 bytes in host order.
     """
-    print_v("NetID", formx(netid_x), formx(netid_x[::-1]))
     netid_b = x2bin(netid_x)
-    nwkid_b = netid_b[0:7]
-    print_v("NwkID", formx(nwkid_b,"bin"), indent=2)
     return {
             "netid": netid_x,
-            "nwkid": nwkid_b,
+            "nwkid": netid_b[0:7],
             "residue": netid_b[7:]
             }
 
@@ -1269,23 +1420,10 @@ def parse_dlsettings(dlsets):
             RX2DataRate: 4 b
     """
     dlsets_b = x2bin(dlsets)
-    rfu_b = dlsets_b[0]
-    dlsets_rx1do_b = dlsets_b[1:4]
-    dlsets_rx1do_i = int(dlsets_b[1:4], 2)
-    dlsets_rx2dr_b = dlsets_b[4:]
-    dlsets_rx2dr_i = int(dlsets_b[4:], 2)
-    #
-    print_v("DLSettings", formx(dlsets), formx(dlsets_b,"bin"))
-    print_v("RFU", formx(rfu_b,"bin"), indent=2)
-    print_v("RX1DROffset", dlsets_rx1do_i, formx(dlsets_rx1do_b,"bin"),
-            indent=2)
-    print_v("RX2DataRate", dlsets_rx2dr_i, formx(dlsets_rx2dr_b,"bin"),
-            indent=2)
-    #
     return {
             "dlsettings": dlsets,
-            "rx1droffset": dlsets_rx1do_i,
-            "rx2datarate": dlsets_rx2dr_i,
+            "rx1droffset": int(dlsets_b[1:4], 2),
+            "rx2datarate": int(dlsets_b[4:], 2),
             }
 
 def parse_cflist(cflist_x, region, version):
@@ -1303,18 +1441,13 @@ def parse_cflist(cflist_x, region, version):
     else:
         raise NotImplementedError("CFList of xxx is not implemented yet.")
     #
-    print_v("CFList", formx(cflist_x))
     cflist = []
     for i in range(5):
-        cf = cflist_x[i*3:i*3+3]
-        cf_i = x2int(cf)
-        cflist.append(cf_i)
-        print_v("CF{}".format(nb_start+i), formx(cf_i,"hz"), formx(cf),
-                indent=2)
-    print_v("CFListType", cflist_x[-1], formx(cflist_x[-2:-1]), indent=2)
+        cflist.append(x2int(cflist_x[i*3:i*3+3]))
     return {
             "cflist": cflist,
-            "cflisttype": cflist_x[-1]
+            "cflisttype": cflist_x[-1],
+            "nb_start": nb_start,
             }
 
 def parse_join_accept(phy_pdu, appkey=None, version="1.0.3", region="AS923"):
@@ -1333,66 +1466,34 @@ def parse_join_accept(phy_pdu, appkey=None, version="1.0.3", region="AS923"):
     - At the server, Join-Accept + MIC are encrypted by:
         aes128_decrypt(AppKey, Join-Accept | MIC)
     """
-    if len(phy_pdu) not in [17,33]:
-        print_w("length of PHY PDU of Join Accept must be 17 or 33, but {}".format(len(phy_pdu)))
-    payload = phy_pdu[1:]
-    if appkey is not None:
-        # See the section of Join Accept message.
-        # LoRaWN network server uses aes128_decrypt to encrypt the response.
-        # So, here, it's correct to use lorawan_encrypt().
-        print_d("Appkey", formx(appkey))
-        print_d("Data", formx(payload))
-        print_d("Data length", "{}".format(len(payload)))
-        payload = lorawan_aes128_encrypt(appkey, payload)
-        print_d("Decrypted", formx(payload))
-    else:
-        print_w("not decrypt Join Accept due to no AppKey specified.")
+    if appkey is None:
         return {}
+    # See the section of Join Accept message.
+    # LoRaWN network server uses aes128_decrypt to encrypt the response.
+    # So, here, it's correct to use lorawan_encrypt().
+    payload = lorawan_aes128_encrypt(appkey, phy_pdu[1:])
     #
-    appnonce_x = payload[0:3][::-1]
-    netid_x = payload[3:6][::-1]
-    devaddr = payload[6:10][::-1]
-    dlsettings_x = payload[10:11]
-    rxdelay_x = payload[11:12]
-    mic_explicit = payload[-__MIC_SIZE:][::-1]
-    #
-    print_v("AppNonce", formx(appnonce_x), formx(appnonce_x[::-1]))
-    netid_o = parse_netid(netid_x)
-    print_v("DevAddr", formx(devaddr), formx(devaddr[::-1]))
-    if version != "1.0":
-        dlsets_o = parse_dlsettings(dlsettings_x[0])
-    else:
-        print_v("RFU", formx(dlsettings_x), formx(dlsettings_x))
-    rxdelay_i = 1 if rxdelay_x[0] == 0 else rxdelay_x[0]
-    print_v("RxDelay", "{} sec".format(rxdelay_i), formx(rxdelay_x))
+    netid_o = parse_netid(payload[3:6][::-1])
+    rxdelay_i = payload[11]
     # base object to be returned.
     ret_o = {
-            "appnonce": appnonce_x,
+            "appnonce": payload[0:3][::-1],
             "netid": netid_o["netid"],
             "nwkid": netid_o["nwkid"],
-            "devaddr": devaddr,
-            "rxdelay": rxdelay_i,
-            "mic_explicit": mic_explicit,
+            "devaddr": payload[6:10][::-1],
+            "rxdelay": 1 if rxdelay_i == 0 else rxdelay_i,
+            "mic_explicit": payload[-__MIC_SIZE:][::-1],
+            "payload": payload,
             }
     if version != "1.0":
-        ret_o.update({
-                "dlsettings": dlsets_o["dlsettings"],
-                "rx1droffset": dlsets_o["rx1droffset"],
-                "rx2datarate": dlsets_o["rx2datarate"]})
+        ret_o.update(parse_dlsettings(payload[10]))
     # parse cflist if needed.
     if len(phy_pdu) == 33:
         cflist_o = parse_cflist(payload[12:28], region, version=version)
         ret_o.update({"cflist": cflist_o})
     # MIC calculation
-    if appkey is not None:
-        buf = phy_pdu[0:1] + payload[:-__MIC_SIZE]
-        print_d("Appkey", formx(appkey))
-        print_d("Msg", formx(buf))
-        mic_o = lorawan_aes128_cmac(appkey, buf)
-        print_d("CMAC", formx(mic_o["cmac"]))
-        ret_o.update({"mic_derived": mic_o["mic"]})
-    else:
-        print_w("not calculated MIC due to no AppKey specified.")
+    mic_o = lorawan_aes128_cmac(appkey, phy_pdu[0:1] + payload[:-__MIC_SIZE])
+    ret_o.update({"mic_derived": mic_o["mic"], "cmac_derived": mic_o["cmac"]})
     #
     return ret_o
 
@@ -1403,87 +1504,39 @@ def parse_join_request(phy_pdu, appkey=None):
           8    |   8    |    2
         AppEUI | DevEUI | DevNonce
     """
-    if len(phy_pdu) != 23:
-        print_w("length of PHY PDU of Join Request must be 23, but {}".format(len(phy_pdu)))
     payload = phy_pdu[1:]
-    appeui_x = payload[0:8][::-1]
-    deveui_x = payload[8:16][::-1]
-    devnonce_x = payload[16:18][::-1]
-    #
-    print_v("AppEUI", formx(appeui_x), formx(appeui_x[::-1]))
-    print_v("DevEUI", formx(deveui_x), formx(deveui_x[::-1]))
-    print_v("DevNonce", formx(devnonce_x), formx(devnonce_x[::-1]))
     # base object to be returned.
     ret_o = {
-            "appeui": appeui_x,
-            "deveui": deveui_x,
-            "devnonce": devnonce_x,
+            "appeui": payload[0:8][::-1],
+            "deveui": payload[8:16][::-1],
+            "devnonce": payload[16:18][::-1],
             }
     # MIC calculation
     if appkey is not None:
-        buf = phy_pdu[:-__MIC_SIZE]
-        print_d("Appkey", formx(appkey))
-        print_d("Msg", formx(buf))
-        mic_o = lorawan_aes128_cmac(appkey, buf)
-        print_d("CMAC", formx(mic_o["cmac"]))
-        ret_o.update({"mic_derived": mic_o["mic"]})
-    else:
-        print_w("not calculated MIC due to no AppKey specified.")
+        mic_o = lorawan_aes128_cmac(appkey, phy_pdu[:-__MIC_SIZE])
+        ret_o.update({"mic_derived": mic_o["mic"],
+                      "cmac_derived": mic_o["cmac"]})
     #
     return ret_o
 
 def parse_mhdr(mhdr):
     """
     MHDR parser
-        mhdr: 1 byte.
+        mhdr: 1 byte in int.
             7 6 5 | 4 3 2 |  1 0
             MType |  RFU  | Major
+        return: MHDRDict, mhdr, mtype_i, mtype_cmd, major_i and msg_dir.
+            mhdr_bits, mtype and major in bit string are computed lazily.
     """
-    # MHDR parser.
-    def get_mtype_cmd(mtype):
-        return {
-            "000": "Join Request",
-            "001": "Join Accept",
-            "010": "Unconfirmed Data Up",
-            "011": "Unconfirmed Data Down",
-            "100": "Confirmed Data Up",
-            "101": "Confirmed Data Down",
-            "110": "RFU",
-            "111": "Proprietary"
-            }[mtype]
-    #
-    def get_major(major):
-        return {
-            "00": "LoRaWAN R1",
-            "01": "RFU",
-            "10": "RFU",
-            "11": "RFU"
-            }[major]
-    #
-    mhdr_b = x2bin(mhdr)
-    mtype_b = mhdr_b[0:3]
-    mtype_cmd = get_mtype_cmd(mtype_b)
-    rfu_b = mhdr_b[3:6]
-    major_b = mhdr_b[6:]
-    #
-    print_vt("MHDR", formx(mhdr), formx(mhdr_b,"bin"))
-    print_v("MType", get_mtype_cmd(mtype_b), formx(mtype_b,"bin"))
-    print_v("RFU", formx(rfu_b,"bin"))
-    print_v("Major", get_major(major_b), formx(major_b,"bin"))
-    #
-    return {
-            "mhdr_bits": mhdr_b,
-            "mtype": mtype_b,
-            "mtype_cmd": mtype_cmd,
-            "major": major_b,
-            }
+    return MHDRDict(_MHDR_TABLE[mhdr])
 
-def parse_phy_pdu(phy_pdu, nwkskey=None, appskey=None, appkey=None,
-                  version="1.0.3", upper_fcnt=b"\x00\x00",
-                  parse_only=False, option=None):
+def decode_phy_pdu(phy_pdu, nwkskey=None, appskey=None, appkey=None,
+                   version="1.0.3", upper_fcnt=b"\x00\x00", partial=False):
     """
-    PHYPayload parser
+    PHYPayload decoder
         all arguments are in bytearray.
+        it doesn't print anything. use print_phy_pdu() to show the result.
+        partial: see parse_mac_payload().
         the format is like below:
               1  |    1...M   |  4
             MHDR | MACPayload | MIC
@@ -1492,56 +1545,504 @@ def parse_phy_pdu(phy_pdu, nwkskey=None, appskey=None, appkey=None,
     """
     if not phy_pdu:
         raise ValueError("phy_pdu must need more than 1 bytes.")
-    # set the flag whether to display values or not.
-    global __parse_only
-    __parse_only = parse_only
-    # set opt.
-    if option is not None:
-        global opt
-        opt = option
-    #
-    if parse_only is False:
-        print("=== PHYPayload ===")
-    if opt.verbose:
-        print_v("PDU", formx(phy_pdu))
-
     mhdr_o = parse_mhdr(phy_pdu[0])
-    payload = phy_pdu[1:-__MIC_SIZE]
+    mtype_i = mhdr_o["mtype_i"]
     # parse each type of message.
-    if mhdr_o["mtype"] == "000":
-        print_vt("JoinReq", formx(payload))
+    if mtype_i == MTYPE_JOIN_REQUEST:
         msg_o = parse_join_request(phy_pdu, appkey=appkey)
-        mic_x = phy_pdu[-__MIC_SIZE:][::-1]
-    elif mhdr_o["mtype"] == "001":
-        print_vt("JoinAccept", formx(payload))
+        mic_x = phy_pdu[-1:-__MIC_SIZE-1:-1]
+    elif mtype_i == MTYPE_JOIN_ACCEPT:
         msg_o = parse_join_accept(phy_pdu, appkey=appkey, version=version)
-        if "mic_explicit" in msg_o:
-            mic_x = msg_o["mic_explicit"]
-        else:
-            mic_x = None
-    elif mhdr_o["mtype"] in [ "011", "101", "010", "100" ]:
-        print_vt("MACPayload", formx(payload))
+        mic_x = msg_o.get("mic_explicit")
+    elif mtype_i in MTYPE_DATA:
         msg_o = parse_mac_payload(phy_pdu, mhdr_o,
                                   nwkskey=nwkskey, appskey=appskey,
-                                  version=version, upper_fcnt=upper_fcnt)
-        mic_x = phy_pdu[-__MIC_SIZE:][::-1]
+                                  version=version, upper_fcnt=upper_fcnt,
+                                  partial=partial)
+        mic_x = phy_pdu[-1:-__MIC_SIZE-1:-1]
     else:
-        print_vt("Proprietary", formx(payload))
         msg_o = { "msg": "proprietary" }
-        mic_x = phy_pdu[-__MIC_SIZE:][::-1]
+        mic_x = phy_pdu[-1:-__MIC_SIZE-1:-1]
     # base object to be returned.
     ret_o = {
             "mhdr": mhdr_o,
             "body": msg_o,
             }
-    print_vt("MIC")
     if mic_x is not None:
-        print_v("MIC in frame", formx(mic_x), formx(mic_x[::-1]))
         ret_o.update({"mic": mic_x})
     else:
         # this is only case when the join response hasn't been decoded.
         pass
+    #
+    return ret_o
+
+#====
+#
+# Printers
+#   they show the result of the decoders according to the module global opt.
+#
+
+def print_fhdr(payload, fhdr_o, msg_dir, version):
+    """
+    FHDR printer.
+    - payload: mac payload (MHDR is not included) in bytes.
+    - fhdr_o: the result of parse_fhdr().
+    """
+    devaddr = fhdr_o["devaddr"]
+    fctrl_o = fhdr_o["fctrl"]
+    fctrl_b = fctrl_o["fctrl_bits"]
+    foptslen_b = fctrl_b[4:]
+    foptslen_i = fctrl_o["foptslen"]
+    #
+    print_v("FHDR", formx(payload[0:7+foptslen_i]))
+    print_v("DevAddr", formx(devaddr), formx(devaddr[::-1]), indent=2)
+    print_v("FCtrl", formx(payload[4:5]), formx(fctrl_b,"bin"), indent=2)
+    #
+    if msg_dir == MSGDIR_DOWN:
+        print_v("ADR", formx(fctrl_b[0],"bin"), indent=3)
+        if version != "1.0":
+            print_v("ADRACKReq", formx(fctrl_b[1],"bin"), indent=3)
+        else:
+            print_v("RFU", formx(fctrl_b[1],"bin"), indent=3)
+        print_v("ACK", formx(fctrl_b[2],"bin"), indent=3)
+        print_v("FPending", formx(fctrl_b[3],"bin"), indent=3)
+        print_v("FOptsLen", foptslen_i, formx(foptslen_b,"bin"), indent=3)
+    else:
+        print_v("ADR", formx(fctrl_b[0],"bin"), indent=3)
+        print_v("ADRACKReq", formx(fctrl_b[1],"bin"), indent=3)
+        print_v("ACK", formx(fctrl_b[2],"bin"), indent=3)
+        if version != "1.0":
+            print_v("RFU", formx(fctrl_b[3],"bin"), indent=3)
+        else:
+            print_v("ClassB", formx(fctrl_b[3],"bin"), indent=3)
+        print_v("FOptsLen", foptslen_i, formx(foptslen_b,"bin"), indent=3)
+    #
+    fcnt = fhdr_o["fcnt"]
+    if len(payload) < 7:
+        # only the FCnt in the frame is shown if FHDR is truncated.
+        fcnt = fcnt[:2] + bytes(payload[5:7][::-1])
+    print_v("FCnt", int.from_bytes(fcnt, "big"), formx(fcnt), indent=2)
+    if foptslen_i > 0:
+        print_v("FOpts", formx(fhdr_o["fopts"]), indent=2)
+        print_mac_cmd(fhdr_o["fopts"], msg_dir, version)
+
+def print_frmp_debug(key_name, key, data, msg_o):
+    print_d(key_name, formx(key))
+    print_d("Data", formx(data))
+    print_d("Data length", "{}".format(len(data)))
+    print_d("DevAddr", formx(msg_o["devaddr"]))
+    print_d("Direction", msg_o["msg_dir"])
+    print_d("FCnt", formx(msg_o["fcnt"]))
+
+def print_mac_payload(phy_pdu, msg_o, nwkskey=None, appskey=None,
+                      version="1.0.3"):
+    """
+    MACPayload printer
+    - phy_pdu: in bytearray.
+    - msg_o: the result of parse_mac_payload().
+    """
+    msg_dir = msg_o["msg_dir"]
+    if msg_dir == MSGDIR_UNKNOWN:
+        print_w("unknown msg direction")
+        return
+    payload = phy_pdu[1:-__MIC_SIZE]
+    print_fhdr(payload, msg_o, msg_dir, version)
+    # MIC calculation
+    if nwkskey is not None:
+        print_frmp_debug("NwkSKey", nwkskey, phy_pdu[0:-__MIC_SIZE], msg_o)
+        print_d("CMAC", formx(msg_o["cmac_derived"]))
+        print_d("MIC", formx(msg_o["mic_derived"]))
+    else:
+        print_w("not checked MIC due to no NwkSKey specified.")
+    #
+    offset = msg_o["fhdr_size"]
+    rest_size = len(payload) - offset
+    if rest_size < 0:
+        print_w("FHDR is truncated. it needs {} bytes, but {}."
+                .format(msg_o["fhdr_size"], len(payload)))
+        return
+    if rest_size == 0:
+        # case 3
+        return
+    # case 1,2,4
+    fport = payload[offset:offset+1]
+    fport_i = fport[0]
+    print_v("FPort", fport_i, formx(fport), indent=2)
+    #
+    offset += 1
+    rest_size -= 1
+    payload = payload[offset:]
+    if rest_size <= 0:
+        print_w("payload size is too short. rest_size={}".format(rest_size))
+        return
+    if fport_i == 0:
+        # case 2
+        print_vt("FRMPayload(MAC Command)", formx(payload))
+        if msg_o["fctrl"]["foptslen"] > 0:
+            print_w("MAC Commands exist in both FOpts and FRMPayload.")
+            # thru
+        if nwkskey is not None:
+            print_frmp_debug("NwkSKey", nwkskey, payload, msg_o)
+            print_d("Decrypted", formx(msg_o["payload"]))
+            print_v("MAC Commands", formx(msg_o["payload"]))
+            print_mac_cmd(msg_o["payload"], msg_dir, version)
+        else:
+            print_w("not decrypted MAC Command due to no NwkSKey specified.")
+    else:
+        # case 1,4
+        if fport_i == 224:
+            print_vt("FRMPayload (MAC Command Test)", formx(payload))
+        else:
+            print_vt("FRMPayload (Application Data)", formx(payload))
+        #
+        if appskey is not None:
+            print_frmp_debug("AppSKey", appskey, payload, msg_o)
+            print_d("Decrypted", formx(msg_o["payload"]))
+            #
+            if fport_i == 224:
+                print_v("TestData", formx(msg_o["payload"]))
+            else:
+                print_v("AppData", formx(msg_o["payload"]))
+        else:
+            print_w("not decrypt Application Data due to no AppSKey specified.")
+
+def print_netid(netid_o):
+    netid_x = netid_o["netid"]
+    print_v("NetID", formx(netid_x), formx(netid_x[::-1]))
+    print_v("NwkID", formx(netid_o["nwkid"],"bin"), indent=2)
+
+def print_dlsettings(dlsets_o):
+    dlsets = dlsets_o["dlsettings"]
+    dlsets_b = x2bin(dlsets)
+    print_v("DLSettings", formx(dlsets), formx(dlsets_b,"bin"))
+    print_v("RFU", formx(dlsets_b[0],"bin"), indent=2)
+    print_v("RX1DROffset", dlsets_o["rx1droffset"], formx(dlsets_b[1:4],"bin"),
+            indent=2)
+    print_v("RX2DataRate", dlsets_o["rx2datarate"], formx(dlsets_b[4:],"bin"),
+            indent=2)
+
+def print_cflist(cflist_x, cflist_o):
+    print_v("CFList", formx(cflist_x))
+    for i,cf_i in enumerate(cflist_o["cflist"]):
+        print_v("CF{}".format(cflist_o["nb_start"]+i), formx(cf_i,"hz"),
+                formx(cflist_x[i*3:i*3+3]), indent=2)
+    print_v("CFListType", cflist_x[-1], formx(cflist_x[-2:-1]), indent=2)
+
+def print_join_accept(phy_pdu, msg_o, appkey=None, version="1.0.3"):
+    """
+    JoinAccept printer
+    - phy_pdu is MHDR + Join-Accept + MIC in bytearray.
+    - msg_o: the result of parse_join_accept().
+    """
+    if len(phy_pdu) not in [17,33]:
+        print_w("length of PHY PDU of Join Accept must be 17 or 33, but {}".format(len(phy_pdu)))
+    if appkey is None:
+        print_w("not decrypt Join Accept due to no AppKey specified.")
+        return
+    payload = msg_o["payload"]
+    print_d("Appkey", formx(appkey))
+    print_d("Data", formx(phy_pdu[1:]))
+    print_d("Data length", "{}".format(len(phy_pdu[1:])))
+    print_d("Decrypted", formx(payload))
+    #
+    appnonce_x = msg_o["appnonce"]
+    devaddr = msg_o["devaddr"]
+    print_v("AppNonce", formx(appnonce_x), formx(appnonce_x[::-1]))
+    print_netid(msg_o)
+    print_v("DevAddr", formx(devaddr), formx(devaddr[::-1]))
+    if version != "1.0":
+        print_dlsettings(msg_o)
+    else:
+        print_v("RFU", formx(payload[10:11]), formx(payload[10:11]))
+    print_v("RxDelay", "{} sec".format(msg_o["rxdelay"]), formx(payload[11:12]))
+    if "cflist" in msg_o:
+        print_cflist(payload[12:28], msg_o["cflist"])
+    # MIC calculation
+    print_d("Appkey", formx(appkey))
+    print_d("Msg", formx(phy_pdu[0:1] + payload[:-__MIC_SIZE]))
+    print_d("CMAC", formx(msg_o["cmac_derived"]))
+
+def print_join_request(phy_pdu, msg_o, appkey=None):
+    """
+    Join Request printer
+    - msg_o: the result of parse_join_request().
+    """
+    if len(phy_pdu) != 23:
+        print_w("length of PHY PDU of Join Request must be 23, but {}".format(len(phy_pdu)))
+    print_v("AppEUI", formx(msg_o["appeui"]), formx(msg_o["appeui"][::-1]))
+    print_v("DevEUI", formx(msg_o["deveui"]), formx(msg_o["deveui"][::-1]))
+    print_v("DevNonce", formx(msg_o["devnonce"]),
+            formx(msg_o["devnonce"][::-1]))
+    # MIC calculation
+    if appkey is not None:
+        print_d("Appkey", formx(appkey))
+        print_d("Msg", formx(phy_pdu[:-__MIC_SIZE]))
+        print_d("CMAC", formx(msg_o["cmac_derived"]))
+    else:
+        print_w("not calculated MIC due to no AppKey specified.")
+
+def print_mhdr(mhdr, mhdr_o):
+    """
+    MHDR printer
+        mhdr: 1 byte.
+        mhdr_o: the result of parse_mhdr().
+    """
+    mhdr_b = mhdr_o["mhdr_bits"]
+    major_b = mhdr_o["major"]
+    print_vt("MHDR", formx(mhdr), formx(mhdr_b,"bin"))
+    print_v("MType", mhdr_o["mtype_cmd"], formx(mhdr_o["mtype"],"bin"))
+    print_v("RFU", formx(mhdr_b[3:6],"bin"))
+    print_v("Major", "LoRaWAN R1" if major_b == "00" else "RFU",
+            formx(major_b,"bin"))
+
+def print_phy_pdu(phy_pdu, pdu_o, nwkskey=None, appskey=None, appkey=None,
+                  version="1.0.3"):
+    """
+    PHYPayload printer
+        phy_pdu and the keys must be the same as passed to decode_phy_pdu().
+        pdu_o: the result of decode_phy_pdu().
+    """
+    mhdr_o = pdu_o["mhdr"]
+    msg_o = pdu_o["body"]
+    print("=== PHYPayload ===")
+    if opt.verbose:
+        print_v("PDU", formx(phy_pdu))
+    print_mhdr(phy_pdu[0], mhdr_o)
+    payload = phy_pdu[1:-__MIC_SIZE]
+    mtype_i = mhdr_o["mtype_i"]
+    # print each type of message.
+    if mtype_i == MTYPE_JOIN_REQUEST:
+        print_vt("JoinReq", formx(payload))
+        print_join_request(phy_pdu, msg_o, appkey=appkey)
+    elif mtype_i == MTYPE_JOIN_ACCEPT:
+        print_vt("JoinAccept", formx(payload))
+        print_join_accept(phy_pdu, msg_o, appkey=appkey, version=version)
+    elif mtype_i in MTYPE_DATA:
+        print_vt("MACPayload", formx(payload))
+        print_mac_payload(phy_pdu, msg_o, nwkskey=nwkskey, appskey=appskey,
+                          version=version)
+    else:
+        print_vt("Proprietary", formx(payload))
+    print_vt("MIC")
+    if "mic" in pdu_o:
+        mic_x = pdu_o["mic"]
+        print_v("MIC in frame", formx(mic_x), formx(mic_x[::-1]))
     if "mic_derived" in msg_o:
         print_v("MIC Derived ", formx(msg_o["mic_derived"]))
+
+def parse_phy_pdu(phy_pdu, nwkskey=None, appskey=None, appkey=None,
+                  version="1.0.3", upper_fcnt=b"\x00\x00",
+                  parse_only=False, option=None):
+    """
+    PHYPayload parser
+        decode phy_pdu by decode_phy_pdu() and show the result
+        unless parse_only is True.
+        all arguments are in bytearray.
+        the format is like below:
+              1  |    1...M   |  4
+            MHDR | MACPayload | MIC
+            MHDR |   JoinReq  | MIC
+            MHDR |   JoinRes  | MIC
+    """
+    pdu_o = decode_phy_pdu(phy_pdu, nwkskey=nwkskey, appskey=appskey,
+                           appkey=appkey, version=version,
+                           upper_fcnt=upper_fcnt, partial=True)
+    if parse_only is False:
+        # set opt.
+        if option is not None:
+            global opt
+            opt = option
+        print_phy_pdu(phy_pdu, pdu_o, nwkskey=nwkskey, appskey=appskey,
+                      appkey=appkey, version=version)
     #
-    return ret_o
+    return pdu_o
+
+"""
+Result of decode_frame()
+    mtype: MType in int, one of MTYPE_*.
+    msg_dir: MSGDIR_UP, MSGDIR_DOWN or MSGDIR_UNKNOWN.
+    devaddr: DevAddr, 4 bytes in big endian, or None.
+    fcnt: FCnt in int including the upper 16-bit, or None.
+    fport: FPort in int, or None if the frame has no FPort.
+    payload: decrypted FRMPayload in bytearray, or None if not decrypted.
+    mic: MIC in the frame, 4 bytes in big endian, or None.
+    mic_ok: result of the MIC check, or None if the MIC was not checked.
+    fopts: FOpts in bytes, or None if the frame has no FOpts.
+    mac_cmds: a list of MACCommand decoded from FOpts, or from the decrypted
+        FRMPayload of FPort 0.  None if the frame has no MAC command,
+        FRMPayload of FPort 0 is not decrypted, or a MAC command is truncated.
+        the raw FOpts is still in fopts for the last case.
+"""
+DecodedFrame = namedtuple("DecodedFrame", [ "mtype", "msg_dir", "devaddr",
+                                            "fcnt", "fport", "payload",
+                                            "mic", "mic_ok",
+                                            "fopts", "mac_cmds" ])
+
+def decode_frame(phy_pdu, nwkskey=None, appskey=None, appkey=None,
+                 version="1.0.3", upper_fcnt=b"\x00\x00"):
+    """
+    decode a PHYPayload in-process without printing anything.
+        all arguments are in bytearray as same as decode_phy_pdu().
+        return: DecodedFrame.
+    it raises ValueError if the size of the frame is not valid for the MType.
+    """
+    size = len(phy_pdu)
+    if size < __MHDR_SIZE + __MIC_SIZE:
+        raise ValueError("phy_pdu must need {} bytes at least, but {}."
+                         .format(__MHDR_SIZE + __MIC_SIZE, size))
+    mtype_i = phy_pdu[0] >> 5
+    if mtype_i == MTYPE_JOIN_REQUEST and size != __JOIN_REQUEST_SIZE:
+        raise ValueError("Join Request must be {} bytes, but {}."
+                         .format(__JOIN_REQUEST_SIZE, size))
+    if mtype_i == MTYPE_JOIN_ACCEPT and size not in __JOIN_ACCEPT_SIZES:
+        raise ValueError("Join Accept must be {} or {} bytes, but {}."
+                         .format(*__JOIN_ACCEPT_SIZES, size))
+    pdu_o = decode_phy_pdu(phy_pdu, nwkskey=nwkskey, appskey=appskey,
+                           appkey=appkey, version=version,
+                           upper_fcnt=upper_fcnt)
+    body_o = pdu_o["body"]
+    fcnt = body_o.get("fcnt")
+    mic_x = pdu_o.get("mic")
+    mic_derived = body_o.get("mic_derived")
+    fopts = body_o.get("fopts")
+    msg_dir = pdu_o["mhdr"]["msg_dir"]
+    if fopts:
+        mac_cmds = fopts
+    elif body_o.get("fport") == 0:
+        mac_cmds = body_o.get("payload")
+    else:
+        mac_cmds = None
+    if mac_cmds is not None:
+        # a truncated MAC command doesn't make the rest of the frame invalid.
+        try:
+            mac_cmds = decode_mac_cmds(mac_cmds, msg_dir)
+        except ValueError:
+            mac_cmds = None
+    return DecodedFrame(
+            mtype=pdu_o["mhdr"]["mtype_i"],
+            msg_dir=msg_dir,
+            devaddr=body_o.get("devaddr"),
+            fcnt=None if fcnt is None else int.from_bytes(fcnt, "big"),
+            fport=body_o.get("fport"),
+            payload=body_o.get("payload"),
+            mic=mic_x,
+            mic_ok=(None if mic_x is None or mic_derived is None else
+                    mic_x == mic_derived),
+            fopts=fopts,
+            mac_cmds=mac_cmds)
+
+def frame_to_dict(frame):
+    """
+    convert a DecodedFrame into a dict which can be serialized into JSON.
+    bytes and bytearray are converted into hex strings, and each MACCommand
+    into a dict of cid, name and the dict of fields.
+    """
+    ret = { k:(v.hex() if isinstance(v, (bytes, bytearray)) else v)
+           for k,v in frame._asdict().items() }
+    if frame.mac_cmds is not None:
+        ret["mac_cmds"] = [{ "cid": c.cid, "name": c.name,
+                            "fields": c.fields._asdict() }
+                           for c in frame.mac_cmds]
+    return ret
+
+if __name__ == "__main__":
+    # MAC Command decoder.
+    mac_cmd_test = [
+        # (MAC Commands, direction, expected)
+        ("0307", MSGDIR_UP,
+         [(0x03, "LinkADRAns", (1, 1, 1))]),
+        # it stops at the unknown CID 0xff.
+        ("020307ff07", MSGDIR_UP,
+         [(0x02, "LinkCheckReq", ()),
+          (0x03, "LinkADRAns", (1, 1, 1))]),
+        ("0603e0b58c50", MSGDIR_DOWN,
+         [(0x06, "DevStatusReq", ()),
+          (0x03, "LinkADRReq", (14, 0, 0x8cb5, 5, 0))]),
+        ("06ff3f", MSGDIR_UP,
+         [(0x06, "DevStatusAns", (255, -1))]),
+        # PingSlotChannelAns is 1 byte.
+        ("11020307", MSGDIR_UP,
+         [(0x11, "PingSlotChannelAns", (1, 0)),
+          (0x03, "LinkADRAns", (1, 1, 1))]),
+        ("0705e0b58c50", MSGDIR_DOWN,
+         [(0x07, "NewChannelReq", (5, 0x8cb5e0, 5, 0))]),
+        ]
+    for mac_cmds, msg_dir, expected in mac_cmd_test:
+        result = [(c.cid, c.name, tuple(c.fields))
+                  for c in decode_mac_cmds(a2b_hex(mac_cmds), msg_dir)]
+        print("OK" if result == expected else "NG", mac_cmds, result)
+    try:
+        decode_mac_cmds(a2b_hex("03e0b5"), MSGDIR_DOWN)
+        print("NG truncated command is not detected.")
+    except ValueError as e:
+        print("OK", e)
+    # MAC Commands in FOpts and FRMPayload of FPort 0 in decode_frame().
+    nwkskey = a2b_hex("70ff6652c80bcee90b21f2d74bf336b2")
+    frame_test = [
+        # (frame, keys, expected mac_cmds in frame_to_dict())
+        ("40b200efbe9a0300030705070703070310040209aa50b1f0792f31ad9c63785f838d95c6fe81d29709ba3c6e19",
+         {},
+         [{"cid": 3, "name": "LinkADRAns",
+          "fields": {"PowerACK": 1, "DataRateACK": 1, "ChannelMaskACK": 1}},
+         {"cid": 5, "name": "RXParamSetupAns",
+          "fields": {"RX1DRoffsetACK": 1, "RX2DataRateACK": 1,
+                     "ChannelACK": 1}},
+         {"cid": 7, "name": "NewChannelAns",
+          "fields": {"DataRateRangeOk": 1, "ChannelFrequencyOk": 1}},
+         {"cid": 7, "name": "NewChannelAns",
+          "fields": {"DataRateRangeOk": 1, "ChannelFrequencyOk": 1}},
+         {"cid": 16, "name": "PingSlotInfoReq",
+          "fields": {"Periodicity": 4}}]),
+        # 06020a05 in FRMPayload of FPort 0, encrypted by the NwkSKey.
+        ("603409be2b000100000bb81582bd5e458b",
+         {"nwkskey": nwkskey},
+         [{"cid": 6, "name": "DevStatusReq", "fields": {}},
+          {"cid": 2, "name": "LinkCheckAns",
+           "fields": {"Margin": 10, "GwCnt": 5}}]),
+        # 06 in FRMPayload of FPort 0, not decrypted without the NwkSKey.
+        ("603409be2b000100000b443f999b",
+         {},
+         None),
+        # 0602 in FRMPayload of FPort 0, LinkCheckAns is truncated.
+        ("603409be2b000100000bb8f72a6d77",
+         {"nwkskey": nwkskey},
+         None),
+        ]
+    for frame, keys, expected in frame_test:
+        try:
+            result = frame_to_dict(decode_frame(a2b_hex(frame), **keys))
+            result = result["mac_cmds"]
+        except ValueError as e:
+            result = str(e)
+        print("OK" if result == expected else "NG", frame[:32], result)
+    # allocation benchmark of the decoders.
+    #   peak: the peak of memory allocated while decoding a frame.
+    #   per byte: the increase of peak per byte of FRMPayload between
+    #       16 and 222 bytes, i.e. roughly how many times the frame is copied.
+    import timeit
+    import tracemalloc
+    nwkskey = a2b_hex("70ff6652c80bcee90b21f2d74bf336b2")
+    appskey = a2b_hex("51ebd6666d77121b3782ef59a252e013")
+    def frame(size):
+        return bytearray.fromhex("403409be2b80000002") + bytearray(size+4)
+    def peak(phy_pdu, keys):
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        decode_phy_pdu(phy_pdu, **keys)
+        ret = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        return ret
+    print("{:<16} {:>5} {:>10} {:>8} {:>9}".format(
+          "keys", "size", "usec", "peak", "per byte"))
+    for name,keys in [("none", {}),
+                      ("nwkskey", {"nwkskey": nwkskey}),
+                      ("appskey", {"appskey": appskey}),
+                      ("both", {"nwkskey": nwkskey, "appskey": appskey})]:
+        decode_phy_pdu(frame(16), **keys)
+        per_byte = (peak(frame(222), keys) - peak(frame(16), keys))/(222-16)
+        for size in [16, 222]:
+            phy_pdu = frame(size)
+            usec = min(timeit.repeat(lambda: decode_phy_pdu(phy_pdu, **keys),
+                                     number=2000, repeat=5))/2000*1e6
+            print("{:<16} {:>5} {:>10.2f} {:>8} {:>9.2f}".format(
+                  name, size, usec, peak(phy_pdu, keys), per_byte))
@@ -1,20 +1,42 @@
 import yags, datetime, time
 import os
-import sys, select
-import subprocess
+import sys
+import asyncio
+import threading
+import shutil
+import collections
 import paho.mqtt.client as mqtt
 import geolocation
 import json
 import base64
 import math
+import struct
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lorawan-parser"))
+
+from lorawan_a2b_hex import a2b_hex
+from lorawan_parser  import decode_frame
+from lorawan_cipher  import lorawan_frmp_integrity, UP_LINK
+from lorawan_fcnt    import FCntTracker, upper_fcnt, DEFAULT_FCNT_GAP
+from lorawan_encoder import encode_data_frame, FOPTS_MAX_SIZE
+from lorawan_dedup   import DedupIndex
+
 RX_WINDOW_DELAY        = 66 # 66 sec after TX
                             # 6sec as tolerace 8s window
                             # RX WINDOW2 60s after TX         
 
 OB_LENGTH              = 60 # 60 mins
-DEV_ADDR               = ""
+YAGS_POLL_INTERVAL     = 3  # sec between requests for new packets on yags
+TUI_INTERVAL           = 1  # sec between redraws of TUI
+TUI_MIN_INTERVAL       = 0.2 # sec, TUI is never redrawn more often
+STATUS_INTERVAL        = 1  # sec between writes of status file
+HISTORY_LENGTH         = 5  # packets kept for TUI
+TTN_QUEUE_SIZE         = 1024 # TTN packets waiting for event loop, newer are dropped
+DEDUP_WINDOW           = 600  # sec, same packet from YAGS and TTN is merged within
+DEDUP_SIZE             = 4096 # packets kept for merging at most
+LW_MIN_FRAME_LEN       = 14   # MHDR 1B FHDR 7B FPORT 1B PAYLOAD 1B+ MIC 4B
+LW_DATA_UP_MTYPES      = (0b010, 0b100) # unconfirmed and confirmed data up
 BASELINE               = 1013.25
 
 # PPICO CONSTANT define
@@ -30,6 +52,83 @@ PPICO_EE_CH2_INDEX     = 50
 PPICO_EE_RESERVE       = 51
 PPICO_EE_HISTORY       = 128
 
+# decoders of FRMPayload by FPort, registered with @payloadDecoder(port)
+# decoder is called with payload bytes and returns record with asDict()
+payloadDecoders = {}
+
+def payloadDecoder(port):
+    def register(decoder):
+        payloadDecoders[port] = decoder
+        return decoder
+
+    return register
+
+def decodePayload(port, data):
+    # data in hex as it is in LW packet, None if port has no decoder or payload is broken
+    decoder = payloadDecoders.get(port)
+
+    if decoder is None:
+        return None
+
+    try:
+        return decoder(bytes.fromhex(data))
+    except (ValueError, struct.error):
+        return None
+
+@payloadDecoder(1)
+class Telemetry():
+    # RST SOLAR TEMP PRESS  HPTR
+    # 01  03    35   F5     01
+    __slots__ = ("rst", "solar", "temp", "press", "hptr", "alt")
+    layout    = struct.Struct(">BBbBB")
+
+    def __init__(self, payload):
+        rst, solar, temp, press, hptr = self.layout.unpack_from(payload)
+
+        self.rst   = rst
+        self.solar = (solar / 255) * 2.56
+        self.temp  = temp / 2
+        self.press = press * 4
+        self.hptr  = hptr
+        self.alt   = 44330 * (1.0 - math.pow(self.press / BASELINE, 0.1903))
+
+    def asDict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+class DeviceSession():
+    # state of one end device, sessions share connections to yags and TTN
+    def __init__(self, name, devAddr = None, appSKey = None, nwkSKey = None, ttnDev = None, fcnt = None,
+                 fcntGap = DEFAULT_FCNT_GAP, packetFile = "packet.csv", telemetryFile = "telemetry.csv"):
+        self.name          = name
+        self.devAddr       = devAddr           # in hex as it is in raw frame
+        self.devAddrWire   = None if devAddr is None else bytes(a2b_hex(devAddr))
+        self.appSKey       = a2b_hex(appSKey)
+        self.nwkSKey       = a2b_hex(nwkSKey)  # MIC is checked only if it is set
+        self.ttnDev        = ttnDev            # ID of TTN end device
+        self.packetFile    = packetFile
+        self.telemetryFile = telemetryFile
+
+        # 16-bit FCnt in raw frames to full 32-bit FCnt
+        self.fcntTracker   = FCntTracker(gap = fcntGap)
+
+        if self.devAddrWire is not None and fcnt is not None:
+            self.fcntTracker.accept(self.devAddrWire, fcnt)
+
+        # LW packets from YAGS and TTN by 32-bit FCnt, to merge same packet into first one
+        self.dedupIndex     = DedupIndex(window = DEDUP_WINDOW, size = DEDUP_SIZE)
+
+        self.lastPacketTime = 0
+        self.lastPacketSnr  = 0
+        self.lastFError     = 0
+        self.lastPacketRSSI = 0
+        self.packetsCount   = 0
+        self.upCounter      = 0
+        self.lastUplinkTime = 0
+        self.planedUplinks  = []
+        self.lastLWPackets  = []
+        self.lastTelemetry  = []
+        self.status         = "READY"
+
 parser = argparse.ArgumentParser(description='Ground station client for PPICO V1 mission')
 
 parser.add_argument('--yags',      type=str, help='HOST of yags server with port')
@@ -37,12 +136,20 @@ parser.add_argument('--yags_tx',   type=str, help='UUID of satellite transmitter
 parser.add_argument('--yags_rx',   type=str, help='UUID of groundstation on yags server')
 parser.add_argument('--lw_appkey', type=str, help='Appkey for decode raw LW packets')
 parser.add_argument('--lw_dev',    type=str, help='Device address for decode raw LW packets')
+parser.add_argument('--lw_nwkskey',type=str, help='NwkSKey for check MIC of raw LW packets (optional)')
+parser.add_argument('--lw_fcnt_gap',type=int, default=DEFAULT_FCNT_GAP, help='Max gap of FCnt between raw LW packets')
+parser.add_argument('--lw_fcnt',   type=int, help='Last 32-bit FCnt of device, when restarted after FCnt rolled over 65535, TTN packets also set it')
+parser.add_argument('--devices',   type=str, help='JSON file with list of devices instead of lw_dev, lw_appkey, lw_nwkskey, lw_fcnt and ttn_dev, each {"name", "lw_dev", "lw_appkey", "lw_nwkskey", "lw_fcnt", "ttn_dev", "packet_file", "telemetry_file"}')
 
 parser.add_argument('--ttn_app',  type=str, help='ID of TTN application')
 parser.add_argument('--ttn_dev',  type=str, help='ID of TTN end device')
 parser.add_argument('--ttn_api',  type=str, help='API key for TTN')
 parser.add_argument('--ttn_host', type=str, help='TTN host address')
 
+parser.add_argument('--headless',     action='store_true', help='Run without TUI, commands are taken from control port')
+parser.add_argument('--control_port', type=int, help='Local TCP port for commands in headless mode, one command per line')
+parser.add_argument('--status_file',  type=str, help='JSON file updated with status snapshot (headless or not)')
+
 args       = parser.parse_args()
 
 sat        = None
@@ -55,54 +162,103 @@ if args.yags is None and args.ttn_host is None:
     exit(1)
 
 if args.yags is not None:
-    if args.yags_tx is None or args.yags_rx is None or args.lw_appkey is None or args.lw_dev is None:
+    if args.yags_tx is None or args.yags_rx is None or (args.devices is None and (args.lw_appkey is None or args.lw_dev is None)):
         print("No definaded yags_tx or yags_rx or lw_appkey or lw_dev")
         exit(1)
 
+if args.ttn_host is not None:
+    if (args.ttn_api is None or args.ttn_app is None or (args.devices is None and args.ttn_dev is None)):
+        print("No definaded ttn_app or ttn_dev ot ttn_api")
+        exit(1)
+
+sessions = []
+
+if args.devices is not None:
+    with open(args.devices) as f:
+        for dev in json.load(f):
+            sessions.append(DeviceSession(
+                dev["name"],
+                devAddr       = dev.get("lw_dev"),
+                appSKey       = dev.get("lw_appkey"),
+                nwkSKey       = dev.get("lw_nwkskey"),
+                ttnDev        = dev.get("ttn_dev"),
+                fcnt          = dev.get("lw_fcnt"),
+                fcntGap       = args.lw_fcnt_gap,
+                packetFile    = dev.get("packet_file",    f"packet_{dev["name"]}.csv"),
+                telemetryFile = dev.get("telemetry_file", f"telemetry_{dev["name"]}.csv")
+            ))
+else:
+    sessions.append(DeviceSession(
+        args.ttn_dev or args.lw_dev or "default",
+        devAddr = args.lw_dev,
+        appSKey = args.lw_appkey,
+        nwkSKey = args.lw_nwkskey,
+        ttnDev  = args.ttn_dev,
+        fcnt    = args.lw_fcnt,
+        fcntGap = args.lw_fcnt_gap
+    ))
+
+for session in sessions:
+    if session.devAddr is not None and session.appSKey is None:
+        print(f"No definaded lw_appkey for device {session.name}")
+        exit(1)
+
+# packets are routed to sessions by DevAddr in raw frame or by TTN device ID
+sessionsByDevAddr = {session.devAddrWire: session for session in sessions if session.devAddrWire is not None}
+sessionsByTTNDev  = {session.ttnDev: session for session in sessions if session.ttnDev is not None}
+currentSession    = sessions[0] # shown in TUI and used by commands
+
+if args.yags is not None:
     yagsServer  = yags.Client              (args.yags)
     sat         = yagsServer.getTransmitter(args.yags_tx)
     station     = yagsServer.getReceiver   (args.yags_rx)
 
-    DEV_ADDR = args.lw_dev 
-
     ob = station.planObservation(
         sat,
         datetime.datetime.now(datetime.timezone.utc),
         datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=OB_LENGTH)
     )
 
-if args.ttn_host is not None:
-    if (args.ttn_dev is None or args.ttn_api is None or args.ttn_app is None):
-        print("No definaded ttn_app or ttn_dev ot ttn_api")
-        exit(1)
-
-lastPacketTime    = 0
 lastRawPacketTime = 0
-lastPacketSnr     = 0
-lastFError        = 0
-lastPacketRSSI    = 0
-packetsCount      = 0
-upCounter         = 0
-lastUplinkTime    = 0
 TTNForDownLink    = False
 
 
 lastPackets    = []
-planedUplinks  = []
-lastLWPackets  = []
-lastTelemetry  = []
 
-status         = "READY"
+# lines in csv files, counted when file is written first
+csvLines = {}
+
+# counts of raw frames dropped before decryption by reason
+rejectedFrames = {
+    "length":  0,
+    "mtype":   0,
+    "devaddr": 0,
+    "mic":     0,
+    "decode":  0
+}
+
+# event loop owns all state above, other threads hand over by call_soon_threadsafe
+mainLoop       = None
+uplinkEvent    = None # set when planedUplinks of session may have uplink to send
+tuiEvent       = None # set when TUI should be redrawn now
+dialogActive   = False # TUI is not redrawn while dialog reads stdin
+lastTUILines   = None  # rows on screen, None to redraw whole screen
+lastTUISize    = None
+
+# TTN packets parsed on paho thread (only producer) for event loop (only consumer)
+# deque append and popleft are atomic, so no lock is needed
+ttnQueue       = collections.deque()
+ttnEvent       = None  # set when ttnQueue has packets
+ttnWakeup      = False # wakeup of event loop is pending, so producer does not flood it
+ttnQueueStats  = {
+    "received": 0,
+    "dropped":  0,
+    "maxDepth": 0
+}
 
 def toHex(val, size):
     return f'%0{size}x' % val
 
-def twos_complement(hexstr, bits):
-    value = int(hexstr, 16)
-    if value & (1 << (bits - 1)):
-        value -= 1 << bits
-    return value
-
 def EEWRITE(addr, byte):
     return f"91{toHex(addr, 4)}{toHex(byte, 2)}"
 
@@ -114,9 +270,18 @@ def EEREAD(addr, size, raw = False, rawFRP = 0, rawDRP = 5 * 3):
 
     return f"90{toHex(addr, 4)}{toHex(size, 2)}{toHex(rawFRP, 2)}{toHex(rawDRP, 2)}"
 
-def EECPY(source, addr, label = ""):
-    global planedUplinks
+def addUplink(session, uplink):
+    # dialogs run on stdin thread, so uplink is appended in event loop
+    if threading.current_thread() is threading.main_thread():
+        queueUplink(session, uplink) # command from control port, already in event loop
+    else:
+        mainLoop.call_soon_threadsafe(queueUplink, session, uplink)
+
+def queueUplink(session, uplink):
+    session.planedUplinks.append(uplink)
+    uplinkEvent.set()
 
+def EECPY(session, source, addr, label = ""):
     curretCmd      = ""
     curretExpected = ""
     baseAddr       = addr
@@ -126,12 +291,12 @@ def EECPY(source, addr, label = ""):
 
         pktMaxSize = 30 # 15B 30 hex nums
 
-        if TTNForDownLink:
+        if TTNForDownLink or session.nwkSKey is not None:
             pktMaxSize = 100 # packets can be bigger beacuse we in data part 50B 100 hexnums
 
         # 6 bytes size of readout cmd 12 hex nums
         if (len(curretCmd) + len(tmpCmd) + 12 > pktMaxSize):
-            planedUplinks.append({
+            addUplink(session, {
                 "data":     curretCmd + EEREAD(baseAddr, addr - baseAddr, False),
                 "expected": curretExpected, # readout check
                 "status":   label + " CPY " + str(baseAddr) + " to " + str(addr - 1),
@@ -148,7 +313,7 @@ def EECPY(source, addr, label = ""):
         addr += 1
 
     if (len(curretCmd) > 0):
-        planedUplinks.append({
+        addUplink(session, {
             "data":     curretCmd + EEREAD(baseAddr, addr - baseAddr, False),
             "expected": curretExpected, # readout check
             "status":   label + " CPY " + str(baseAddr) + " to " + str(addr - 1),
@@ -160,8 +325,6 @@ def EECPY(source, addr, label = ""):
 
 
 def setupEEPROM():
-    global planedUplinks
-
     os.system('cls' if os.name == 'nt' else 'clear')
 
     print('Are you sure. Do you realy want SETUP EEPROM (yes/NO):')
@@ -170,11 +333,14 @@ def setupEEPROM():
     if x != "yes":
         return
 
+    planEEPROMSetup(currentSession)
+
+def planEEPROMSetup(session):
     # set delay to 0 (16s)
-    EECPY([0x00], PPICO_EE_DELAY, label = "CHANGE DELAY TO 16s")
+    EECPY(session, [0x00], PPICO_EE_DELAY, label = "CHANGE DELAY TO 16s")
 
     # write freqvency table
-    EECPY([
+    EECPY(session, [
         #0xD9, 0x06, 0x8B,  # Channel 0 868.100 MHz / 61.035 Hz = 14222987 = 0xD9068B alredy in eeprom by default
         0xD9, 0x13, 0x58,  # Channel 1 868.300 MHz / 61.035 Hz = 14226264 = 0xD91358
         0xD9, 0x20, 0x24,  # Channel 2 868.500 MHz / 61.035 Hz = 14229540 = 0xD92024
@@ -186,10 +352,10 @@ def setupEEPROM():
     ], PPICO_EE_FREQ_TABLE + 3, label = "FREQ TABLE")
 
     # Set indexes of datarate to last in table SF12
-    EECPY([0x50, 0x50], PPICO_EE_CH1_INDEX, label = "SF12 BW128")
+    EECPY(session, [0x50, 0x50], PPICO_EE_CH1_INDEX, label = "SF12 BW128")
 
     # write data rate table
-    EECPY([
+    EECPY(session, [
         0x74, 0x72, 0x04,  # SF7BW125 - 0
         0x84, 0x72, 0x04,  # SF8BW125 - 1
         0x94, 0x72, 0x04,  # SF9BW125 - 2
@@ -205,15 +371,15 @@ def setupEEPROM():
 
     # reset all counters
     # RST counter 1B TX 2B RX 2B
-    EECPY([0],    PPICO_EE_RESET_COUNTER, label = "RESET RST COUNTER")
-    EECPY([0, 0], PPICO_EE_RX_COUNTER,    label = "RESET RX  COUNTER")
-    EECPY([0, 0], PPICO_EE_TX_COUNTER,    label = "RESET TX  COUNTER")
+    EECPY(session, [0],    PPICO_EE_RESET_COUNTER, label = "RESET RST COUNTER")
+    EECPY(session, [0, 0], PPICO_EE_RX_COUNTER,    label = "RESET RX  COUNTER")
+    EECPY(session, [0, 0], PPICO_EE_TX_COUNTER,    label = "RESET TX  COUNTER")
 
     # set FR index 2 to random SF 12
-    EECPY([0x50, 0x5F], PPICO_EE_CH1_INDEX, label = "RANDOM FREQ")
+    EECPY(session, [0x50, 0x5F], PPICO_EE_CH1_INDEX, label = "RANDOM FREQ")
 
     # set delay back (~5m)
-    EECPY([0x03], PPICO_EE_DELAY, label = "CHANGE DELAY TO 5m")
+    EECPY(session, [0x03], PPICO_EE_DELAY, label = "CHANGE DELAY TO 5m")
 
 def UserEECPY():
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -226,11 +392,14 @@ def UserEECPY():
 
     data = input()
 
+    planUserEECPY(currentSession, pos, data)
+
+def planUserEECPY(session, pos, data):
     dataBytes = []
     for i in range(0, len(data), 2):
         dataBytes.append(int(data[i : i + 2], 16))
 
-    EECPY(dataBytes, pos, label = "USER EECPY")
+    EECPY(session, dataBytes, pos, label = "USER EECPY")
 
 
 
@@ -250,8 +419,6 @@ def advanced():
         UserEECPY()
 
 def customUplink():
-    global planedUplinks
-
     os.system('cls' if os.name == 'nt' else 'clear')
 
     print('Are you sure. Do you realy want create uplink (yes/NO):')
@@ -278,12 +445,7 @@ def customUplink():
         print('HEX Data to write (one byte):')
         data = int(input(), 16)
 
-        planedUplinks.append({
-            "data":     EEWRITE(addr, data),
-            "expected": None, # readout check
-            "status":   "Custom write " + str(addr) + " = " + str(data),
-            "send":     True
-        })
+        planCustomWrite(currentSession, addr, data)
 
     else:
         print('Readout size:')
@@ -296,26 +458,52 @@ def customUplink():
             print("Freq index:")
             fr = int(input()) * 3
 
-        planedUplinks.append({
-            "data":     EEREAD(addr, size, raw == "yes", rawFRP = fr, rawDRP = dr),
-            "expected": None, # readout check
-            "status":   "Custom read from " + str(addr),
-            "send":     True
-        })
-    
+        planCustomRead(currentSession, addr, size, raw == "yes", fr, dr)
+
+def planCustomWrite(session, addr, data):
+    addUplink(session, {
+        "data":     EEWRITE(addr, data),
+        "expected": None, # readout check
+        "status":   "Custom write " + str(addr) + " = " + str(data),
+        "send":     True
+    })
+
+def planCustomRead(session, addr, size, raw = False, fr = 0, dr = 0):
+    addUplink(session, {
+        "data":     EEREAD(addr, size, raw, rawFRP = fr, rawDRP = dr),
+        "expected": None, # readout check
+        "status":   "Custom read from " + str(addr),
+        "send":     True
+    })
+
 def updateFiles():
     pass
 
-def loraWanMac(macCommands, devAddr):
+def loraWanMac(session, macCommands):
+    devAddr = session.devAddr
+
+    if session.nwkSKey is not None:
+        # real LW frame with MIC, commands longer than FOpts go to data part on port 1 as TTN downlinks
+        commands = a2b_hex(macCommands)
+        devAddrBE = bytes.fromhex(devAddr)[::-1]
+
+        if len(commands) > FOPTS_MAX_SIZE:
+            frame = encode_data_frame(devAddrBE, session.upCounter, fport = 1, payload = commands, nwkskey = session.nwkSKey, appskey = session.appSKey)
+        else:
+            frame = encode_data_frame(devAddrBE, session.upCounter, fopts = commands, nwkskey = session.nwkSKey)
+
+        return frame.hex()
+
     comLen = int(len(macCommands) / 2)
 
     if (comLen > 15):
         print("ERROR too long uplink message " + macCommands)
         exit()
 
-    return f"60{devAddr}{toHex(comLen, 2)}{toHex(upCounter, 4)}{macCommands}00"
+    return f"60{devAddr}{toHex(comLen, 2)}{toHex(session.upCounter, 4)}{macCommands}00"
 
 def addToCsv(filename, data):
+    # returns index of written line for updateLineInCsv
     if not(os.path.exists(filename)):
         with open(filename, "w") as f:  
             for k, v in data.items():
@@ -323,13 +511,23 @@ def addToCsv(filename, data):
 
             f.write("\n")
 
+        csvLines[filename] = 1
+
+    elif filename not in csvLines: # file from last run
+        with open(filename, "r") as f:
+            csvLines[filename] = sum(1 for line in f)
+
     with open(filename, "a") as f:  
         for k, v in data.items():
             f.write(f"{v};")
 
         f.write("\n")
 
-def updateLastInCsv(filename, data):
+    csvLines[filename] += 1
+
+    return csvLines[filename] - 1
+
+def updateLineInCsv(filename, index, data):
     rawText = ""
     for k, v in data.items():
         rawText += f"{v};"
@@ -337,24 +535,16 @@ def updateLastInCsv(filename, data):
     rawText += "\n"
 
     lines = open(filename, 'r').readlines()
-    lines[-1] = rawText
+    lines[index] = rawText
     out = open(filename, 'w')
     out.writelines(lines)
     out.close()
 
-
-def parseTelemetry(data, time, pkt):
-    global lastTelemetry
+def parseTelemetry(session, telemetry, time, pkt):
+    lastTelemetry = session.lastTelemetry
 
     lastTelemetry.append({
-        # RST SOLAR TEMP PRESS  HPTR
-        # 01  03    35   F5     01
-        "rst":      int(data[0] + data[1], 16),
-        "solar":    (int(data[2] + data[3], 16) / 255) * 2.56,
-        "temp":     twos_complement(data[4] + data[5], 8) / 2,
-        "press":    int(data[6] + data[7], 16) * 4,
-        "hptr":     int(data[8] + data[9], 16),
-        "alt":      44330 * (1.0 - math.pow((int(data[6] + data[7], 16) * 4) / BASELINE, 0.1903)),
+        **telemetry.asDict(),
         "lat":      pkt["lat"],
         "lon":      pkt["lon"],
         "gs":       pkt["gs"],
@@ -363,12 +553,12 @@ def parseTelemetry(data, time, pkt):
     })
 
     # save telemetry to file
-    addToCsv("telemetry.csv", lastTelemetry[-1])
+    line = addToCsv(session.telemetryFile, lastTelemetry[-1])
 
-def confirmUplink(data): # uplink is confirmed using expexted downlink
-    global planedUplinks
-    global status
-    global lastUplinkTime
+    return lastTelemetry[-1], line
+
+def confirmUplink(session, data): # uplink is confirmed using expexted downlink
+    planedUplinks = session.planedUplinks
 
     dt = datetime.datetime.now(datetime.timezone.utc)
     utc_time = dt.replace(tzinfo=datetime.timezone.utc)
@@ -376,55 +566,103 @@ def confirmUplink(data): # uplink is confirmed using expexted downlink
 
     if len(planedUplinks) > 0 and not planedUplinks[0]["send"] and (planedUplinks[0]["uplink"] is None or planedUplinks[0]["uplink"].isDone()):
         if data.upper() == planedUplinks[0]["expected"].upper(): # plan next
-            if lastUplinkTime == 0:
-                lastUplinkTime = utc_timestamp - planedUplinks[0]["start"]
+            if session.lastUplinkTime == 0:
+                session.lastUplinkTime = utc_timestamp - planedUplinks[0]["start"]
 
-            lastUplinkTime = (lastUplinkTime + (utc_timestamp - planedUplinks[0]["start"])) / 2
+            session.lastUplinkTime = (session.lastUplinkTime + (utc_timestamp - planedUplinks[0]["start"])) / 2
 
             planedUplinks.pop(0)
-            status = "Uplink confirmed"
+            session.status = "Uplink confirmed"
 
         else: # plan same
             planedUplinks[0]["send"] = True
-            status = "Uplink not confirmed"
+            session.status = "Uplink not confirmed"
 
-def parseLoraWan(pkt):
-    decoded  = subprocess.run(['./lorawan-parser/lorawan-parser.py', '--appskey', args.lw_appkey, pkt["data"]], stdout=subprocess.PIPE).stdout.decode('utf-8').split("\n")
-    devAddr  = ""
-    fCnt     = ""
-    fPort    = ""
-    fAppData = ""
+        uplinkEvent.set() # send next or same right away
 
-    for line in decoded:
-        if line.startswith("    DevAddr : x "):
-            devAddr  = line.replace("    DevAddr : x ", "").upper()
+def prefilterLoraWan(raw):
+    # cheap checks of raw frame before any decryption
+    # returns reason of reject or None
+    if len(raw) < LW_MIN_FRAME_LEN:
+        return "length"
 
-        if line.startswith("    FCnt : "):
-            fCnt     = int(line.replace("    FCnt : ", ""))
+    if raw[0] >> 5 not in LW_DATA_UP_MTYPES:
+        return "mtype"
 
-        if line.startswith("  AppData : x "):
-            fAppData = line.replace("  AppData : x ", "").upper()
+    if bytes(raw[1:5]) not in sessionsByDevAddr: # not our device
+        return "devaddr"
 
-        if line.startswith("    FPort : "):
-            fPort    = int(line.replace("    FPort : ", ""))
+    return None
 
-    reversalDevAddr = "".join([DEV_ADDR[idx:idx+2] for idx in range(len(DEV_ADDR)) if idx % 2 == 0][::-1])
+def checkLoraWanMic(session, raw, fcnt):
+    # frame passed prefilter, so FHDR is there
+    # AES-CMAC of NwkSKey is cached by lorawan_cipher
+    mic = lorawan_frmp_integrity(session.nwkSKey, raw[:-4],
+                                 devaddr = raw[4:0:-1],
+                                 msg_dir = UP_LINK,
+                                 fcnt    = fcnt.to_bytes(4, "big"))
 
-    if devAddr != reversalDevAddr or fCnt == "" or fPort == "" or fAppData == "":
+    return mic["cmac"][:4] == raw[-4:]
+
+def parseLoraWan(pkt):
+    # returns session of device and LW packet, or None
+    try:
+        raw = a2b_hex(pkt["data"])
+    except ValueError:
+        rejectedFrames["decode"] += 1
         return None
 
+    reason = prefilterLoraWan(raw)
+
+    if reason is not None:
+        rejectedFrames[reason] += 1
+        return None
+
+    session = sessionsByDevAddr[bytes(raw[1:5])]
+
+    # 32-bit FCnt from 16-bit FCnt in frame and last accepted FCnt
+    fcnt16 = raw[6] | (raw[7] << 8)
+
+    if session.nwkSKey is None:
+        fcnt = session.fcntTracker.infer(session.devAddrWire, fcnt16)
+    else:
+        # before decryption, so corrupted frame never gets to csv or confirmUplink
+        # MIC also finds FCnt after more than lw_fcnt_gap lost frames
+        fcnt = None
+
+        for candidate in session.fcntTracker.candidates(session.devAddrWire, fcnt16):
+            if checkLoraWanMic(session, raw, candidate):
+                fcnt = candidate
+                break
+
+        if fcnt is None:
+            rejectedFrames["mic"] += 1
+            return None
+
+    try:
+        frame = decode_frame(raw, appskey=session.appSKey, upper_fcnt=upper_fcnt(fcnt))
+    except (ValueError, IndexError):
+        rejectedFrames["decode"] += 1
+        return None # broken frame
+
+    if frame.fcnt is None or frame.fport is None or not frame.payload:
+        rejectedFrames["decode"] += 1
+        return None
+
+    session.fcntTracker.accept(session.devAddrWire, frame.fcnt)
+
     LWPkt = pkt.copy()
 
-    LWPkt["data"]       = fAppData
-    LWPkt["port"]       = fPort
-    LWPkt["counter"]    = fCnt
+    LWPkt["data"]       = frame.payload.hex().upper()
+    LWPkt["port"]       = frame.fport
+    LWPkt["counter"]    = frame.fcnt
     LWPkt["lat"]        = 0
     LWPkt["lon"]        = 0
     LWPkt["gs"]         = 0
     LWPkt["stations"]   = 1
     LWPkt["rawMessage"] = ""
 
-    return LWPkt
+    return session, LWPkt
 
 def TTNOnMessage(mosq, obj, msg):
     data = json.loads(msg.payload.decode("ascii"))
@@ -432,7 +670,9 @@ def TTNOnMessage(mosq, obj, msg):
     if "uplink_message" not in data:
         return # not a downlink message
 
-    if data["end_device_ids"]["device_id"] != args.ttn_dev:
+    session = sessionsByTTNDev.get(data["end_device_ids"]["device_id"])
+
+    if session is None:
         return # not taget device
 
 
@@ -463,72 +703,103 @@ def TTNOnMessage(mosq, obj, msg):
     # use GPS to get best pressure readings
     #updateBaseline(LWPkt["lat"], LWPkt["lon"])
     
-    processNewPacket(LWPkt)
+    # called on paho thread, packet is processed in event loop
+    queueTTNPacket((session, LWPkt))
+
+def queueTTNPacket(pkt):
+    global ttnWakeup
+
+    ttnQueueStats["received"] += 1
+
+    # consumer only makes queue shorter, so this check is exact
+    if len(ttnQueue) >= TTN_QUEUE_SIZE:
+        ttnQueueStats["dropped"] += 1
+        return
 
-def processNewPacket(pkt):
-    global packetsCount
-    global lastPackets
-    global lastTelemetry
-    global lastPacketTime
-    global lastPacketSnr
-    global lastFError
-    global lastPacketRSSI
+    ttnQueue.append(pkt)
+    ttnQueueStats["maxDepth"] = max(ttnQueueStats["maxDepth"], len(ttnQueue))
 
+    if not ttnWakeup:
+        ttnWakeup = True
+        mainLoop.call_soon_threadsafe(ttnEvent.set)
+
+def processNewPacket(session, pkt):
     pkt["direction"] = "down"
 
-    if pkt["time"] > lastPacketTime:
-        lastPacketTime = pkt["time"]
-        lastPacketSnr  = pkt["snr"]
-        lastFError     = pkt["ferror"]
-        lastPacketRSSI = pkt["rssi"]
+    if pkt["time"] > session.lastPacketTime:
+        session.lastPacketTime = pkt["time"]
+        session.lastPacketSnr  = pkt["snr"]
+        session.lastFError     = pkt["ferror"]
+        session.lastPacketRSSI = pkt["rssi"]
+
+    # TTN sends 32-bit FCnt checked by MIC, so raw frames get right upper FCnt even without --lw_fcnt
+    if pkt["rawMessage"] != "" and session.devAddrWire is not None:
+        session.fcntTracker.accept(session.devAddrWire, pkt["counter"])
+
+    key    = pkt["counter"] # session has own index
+    now    = time.monotonic()
+    record = session.dedupIndex.get(key, now)
+
+    if record is not None: # duplicity
+        first = record["pkt"]
+        session.dedupIndex.merged += 1
 
-    if len(lastLWPackets) > 0 and lastLWPackets[-1]["counter"] == pkt["counter"]: # duplicity
-        
         # update count of received
-        lastLWPackets[-1]["stations"] += pkt["stations"]
+        first["stations"] += pkt["stations"]
         
         # update LAT and LON
-        if lastLWPackets[-1]["lat"] == 0 and lastLWPackets[-1]["lon"] == 0:
-            lastLWPackets[-1]["lat"] = pkt["lat"]
-            lastLWPackets[-1]["lon"] = pkt["lon"]
-            lastLWPackets[-1]["gs"]  = pkt["gs"]
+        if first["lat"] == 0 and first["lon"] == 0:
+            first["lat"] = pkt["lat"]
+            first["lon"] = pkt["lon"]
+            first["gs"]  = pkt["gs"]
 
         # add raw data
-        if lastLWPackets[-1]["rawMessage"] == "":
-            lastLWPackets[-1]["rawMessage"] = pkt["rawMessage"]
+        if first["rawMessage"] == "":
+            first["rawMessage"] = pkt["rawMessage"]
 
         # freq shift if yags
-        if lastLWPackets[-1]["ferror"] == 0:
-            lastLWPackets[-1]["ferror"] = pkt["ferror"]
+        if first["ferror"] == 0:
+            first["ferror"] = pkt["ferror"]
         
         # update telemetry
-        lastTelemetry[-1]["lat"]      = lastLWPackets[-1]["lat"]
-        lastTelemetry[-1]["lon"]      = lastLWPackets[-1]["lon"]
-        lastTelemetry[-1]["gs"]       = lastLWPackets[-1]["gs"]
-        lastTelemetry[-1]["stations"] = lastLWPackets[-1]["stations"]
+        if record["telemetry"] is not None:
+            record["telemetry"]["lat"]      = first["lat"]
+            record["telemetry"]["lon"]      = first["lon"]
+            record["telemetry"]["gs"]       = first["gs"]
+            record["telemetry"]["stations"] = first["stations"]
+
+            updateLineInCsv(session.telemetryFile, record["telemetryLine"], record["telemetry"])
 
-        # update last lines in files
-        updateLastInCsv("telemetry.csv", lastTelemetry[-1])
-        updateLastInCsv("packet.csv"   , lastLWPackets[-1])
+        # update lines of packet in files
+        updateLineInCsv(session.packetFile, record["pktLine"], first)
 
         return
 
-    lastLWPackets.append(pkt)
+    session.lastLWPackets.append(pkt)
     
     # save packet to file
-    addToCsv("packet.csv", pkt)
+    record = {
+        "pkt":           pkt,
+        "pktLine":       addToCsv(session.packetFile, pkt),
+        "telemetry":     None,
+        "telemetryLine": None
+    }
+
+    session.dedupIndex.add(key, record, now)
 
-    packetsCount += 1
+    session.packetsCount += 1
 
     # on port 2 is read
     if pkt["port"] == 2:
-        confirmUplink(pkt["data"]) # try confirm uplink
+        confirmUplink(session, pkt["data"]) # try confirm uplink
     else:
-        confirmUplink("") # dummy data fail to confirm
+        confirmUplink(session, "") # dummy data fail to confirm
 
     # on port 1 is telemetry
-    if pkt["port"] == 1:
-        parseTelemetry(pkt["data"], pkt["time"], pkt)
+    decoded = decodePayload(pkt["port"], pkt["data"])
+
+    if isinstance(decoded, Telemetry):
+        record["telemetry"], record["telemetryLine"] = parseTelemetry(session, decoded, pkt["time"], pkt)
 
 def processNewRawPacket(pkt):
     global lastRawPacketTime
@@ -540,45 +811,54 @@ def processNewRawPacket(pkt):
     lwpkt = parseLoraWan(pkt)
 
     if lwpkt is not None:
-        processNewPacket(lwpkt)
+        processNewPacket(*lwpkt)
 
 def updateTUI():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    # returns rows of TUI, drawTUI puts them on screen
+    lines = []
 
     dt = datetime.datetime.now(datetime.timezone.utc)
     utc_time = dt.replace(tzinfo=datetime.timezone.utc)
     utc_timestamp = int(utc_time.timestamp())
 
-    print(f"LAST SNR: {lastPacketSnr}; LAST SEEN: before {utc_timestamp - lastPacketTime}s")
-    print("Saving telemetry to telemetry.csv and all LW packets to packets.csv")
-    print(f"Uplinks: {upCounter}, Downlinks: {packetsCount}, Planed Uplinks: {len(planedUplinks)}, Time per uplink: {lastUplinkTime / 60}m, Need time for uplinks: {(lastUplinkTime * len(planedUplinks)) / 60}m")
-    print("")
-    print("LAST TELEMETRY:")
-    print("Temperature (C)       Pressure (hPA)        Solar (V)        Resets        History PTR        ALT (m)       LAT           LON           GS PRESSION           BEFORE")
+    session       = currentSession
+    planedUplinks = session.planedUplinks
+    lastTelemetry = session.lastTelemetry
+    lastLWPackets = session.lastLWPackets
+
+    lines.append(f"DEVICE: {session.name} ({sessions.index(session) + 1}/{len(sessions)})")
+    lines.append(f"LAST SNR: {session.lastPacketSnr}; LAST SEEN: before {utc_timestamp - session.lastPacketTime}s")
+    lines.append(f"Saving telemetry to {session.telemetryFile} and all LW packets to {session.packetFile}")
+    lines.append(f"Rejected raw frames: {rejectedFrames["length"]} too short, {rejectedFrames["mtype"]} not data up, {rejectedFrames["devaddr"]} other devices, {rejectedFrames["mic"]} bad MIC, {rejectedFrames["decode"]} broken")
+    lines.append(f"TTN queue: {len(ttnQueue)}/{TTN_QUEUE_SIZE} (max {ttnQueueStats["maxDepth"]}), received {ttnQueueStats["received"]}, dropped {ttnQueueStats["dropped"]}")
+    lines.append(f"Uplinks: {session.upCounter}, Downlinks: {session.packetsCount}, Planed Uplinks: {len(planedUplinks)}, Time per uplink: {session.lastUplinkTime / 60}m, Need time for uplinks: {(session.lastUplinkTime * len(planedUplinks)) / 60}m")
+    lines.append("")
+    lines.append("LAST TELEMETRY:")
+    lines.append("Temperature (C)       Pressure (hPA)        Solar (V)        Resets        History PTR        ALT (m)       LAT           LON           GS PRESSION           BEFORE")
 
     for i in range(min(len(lastTelemetry), 5)):
         actPacket = lastTelemetry[len(lastTelemetry) - 1 - i]
-        print(f"{actPacket["temp"]: <22}{actPacket["press"]: <22}{round(actPacket["solar"], 2): <17}{actPacket["rst"]: <14}{actPacket["hptr"]: <19}{round(actPacket["alt"], 1): <14}{round(actPacket["lat"], 5): <14}{round(actPacket["lon"], 5): <14}{actPacket["gs"]: <22}{utc_timestamp - actPacket["time"]:<3}s")
+        lines.append(f"{actPacket["temp"]: <22}{actPacket["press"]: <22}{round(actPacket["solar"], 2): <17}{actPacket["rst"]: <14}{actPacket["hptr"]: <19}{round(actPacket["alt"], 1): <14}{round(actPacket["lat"], 5): <14}{round(actPacket["lon"], 5): <14}{actPacket["gs"]: <22}{utc_timestamp - actPacket["time"]:<3}s")
 
-    print("")
-    print("PLANED UPLINKS (FISRT 5):")
+    lines.append("")
+    lines.append("PLANED UPLINKS (FISRT 5):")
 
     for i in range(min(len(planedUplinks), 5)):
         uplinkStatus = ""
         if planedUplinks[i]["send"] == False:
             uplinkStatus = "Waiting from confirmation"
 
-        print(f"{planedUplinks[i]["data"]: <50}        {planedUplinks[i]["status"]}        {uplinkStatus}")
+        lines.append(f"{planedUplinks[i]["data"]: <50}        {planedUplinks[i]["status"]}        {uplinkStatus}")
 
-    print("")
-    print("RECEIVED RAW DOWNLINKS (LAST 5):")
+    lines.append("")
+    lines.append("RECEIVED RAW DOWNLINKS (LAST 5):")
 
     for i in range(min(5, len(lastPackets))):
         actPacket = lastPackets[len(lastPackets) - 1 - i]
-        print(f"{actPacket["data"]: <50}        BEFORE: {utc_timestamp - actPacket["time"]:<4}s SNR: {actPacket["snr"]:<6}  FERROR: {actPacket["ferror"]:<10}  RSSI:    {actPacket["rssi"]:<7}")
+        lines.append(f"{actPacket["data"]: <50}        BEFORE: {utc_timestamp - actPacket["time"]:<4}s SNR: {actPacket["snr"]:<6}  FERROR: {actPacket["ferror"]:<10}  RSSI:    {actPacket["rssi"]:<7}")
 
-    print("")
-    print("RECEIVED LORAWAN DOWNLINKS (LAST 5):")
+    lines.append("")
+    lines.append("RECEIVED LORAWAN DOWNLINKS (LAST 5):")
     for i in range(min(5, len(lastLWPackets))):
         actPacket = lastLWPackets[len(lastLWPackets) - 1 - i]
 
@@ -589,17 +869,295 @@ def updateTUI():
         else:
             rcvFlags = "[TTN]"
 
-        print(f"{actPacket["data"]: <50}        BEFORE: {utc_timestamp - actPacket["time"]:<4}s SNR: {actPacket["snr"]:<6}  PORT:   {actPacket["port"]:<10}    COUNTER: {actPacket["counter"]:<7}    STATIONS: {actPacket["stations"]:<3}    {rcvFlags}")
+        lines.append(f"{actPacket["data"]: <50}        BEFORE: {utc_timestamp - actPacket["time"]:<4}s SNR: {actPacket["snr"]:<6}  PORT:   {actPacket["port"]:<10}    COUNTER: {actPacket["counter"]:<7}    STATIONS: {actPacket["stations"]:<3}    {rcvFlags}")
 
-    print("")
-    print(f"Status: {status}        E start EEPROM setup        U custom uplink      T on/off TNN for uplinks     A advanced")
+    lines.append("")
+    lines.append(f"Status: {session.status}        E start EEPROM setup        U custom uplink      T on/off TNN for uplinks     A advanced     D next device")
     
     if TTNForDownLink:
-        print("Y Using TTN for uplinks")
+        lines.append("Y Using TTN for uplinks")
     else:
-        print("N NOT using TTN for uplinks")
+        lines.append("N NOT using TTN for uplinks")
+
+    lines.append("Write char and hit enter!")
+
+    return lines
+
+def drawTUI(lines):
+    # returns ANSI sequence which redraws only rows changed since last call
+    global lastTUILines
+    global lastTUISize
+
+    size  = shutil.get_terminal_size()
+    lines = [line[:size.columns] for line in lines] # wrapped row would shift all below
+    out   = []
+
+    if lastTUILines is None or size != lastTUISize:
+        out.append("\033[H\033[2J")
+        lastTUILines = []
+        lastTUISize  = size
+
+    for row, line in enumerate(lines):
+        if row >= len(lastTUILines) or lastTUILines[row] != line:
+            out.append(f"\033[{row + 1};1H{line}\033[K")
+
+    if len(lines) != len(lastTUILines): # clear rows left below and move cursor under TUI
+        out.append(f"\033[{len(lines) + 1};1H\033[J")
+    elif len(out) > 0: # keep cursor where user is writing command
+        out.insert(0, "\0337")
+        out.append("\0338")
+
+    lastTUILines = lines
+
+    return "".join(out)
+
+def writeTUI(data):
+    sys.stdout.write(data)
+    sys.stdout.flush()
+
+def trimHistory():
+    # remove old packets
+    histories = [lastPackets]
+
+    for session in sessions:
+        histories += [session.lastLWPackets, session.lastTelemetry]
+
+    for history in histories:
+        while len(history) > HISTORY_LENGTH:
+            history.pop(0)
+
+async def processUplinks(session):
+    planedUplinks = session.planedUplinks
+
+    while len(planedUplinks) > 0 and planedUplinks[0]["send"]:
+        uplink      = planedUplinks[0]
+        uplinkJob   = None
+
+        dt = datetime.datetime.now(datetime.timezone.utc)
+        utc_time = dt.replace(tzinfo=datetime.timezone.utc)
+        utc_timestamp = int(utc_time.timestamp())
+
+        if not TTNForDownLink and sat is not None and session.devAddr is not None:
+            # yags request blocks, so it is done on worker thread
+            uplinkJob = await asyncio.to_thread(sat.planUplink, station, loraWanMac(session, uplink["data"]), delay=RX_WINDOW_DELAY)
+        elif TTNForDownLink and mqttc is not None and session.ttnDev is not None:
+            mqttc.publish(f"v3/{args.ttn_app}/devices/{session.ttnDev}/down/replace", '{"downlinks":[{"f_port": 1,"frm_payload":"' + base64.b64encode(bytes.fromhex(uplink["data"])).decode("ascii") + '","priority": "NORMAL"}]}')
+        else:
+            session.status = "unable to plan Uplink"
+            return # wait for change of TTNForDownLink
+
+        session.upCounter += 1
+
+        if uplink["status"] is not None:
+            session.status = uplink["status"]
+
+        if uplink["expected"] is not None:
+            uplink["send"]   = False
+            uplink["uplink"] = uplinkJob
+            uplink["start"]  = utc_timestamp
+        else:
+            planedUplinks.pop(0)
+
+        tuiEvent.set()
+
+async def uplinkTask():
+    while True:
+        await uplinkEvent.wait()
+        uplinkEvent.clear()
+
+        for session in sessions:
+            await processUplinks(session)
+
+async def ttnTask():
+    global ttnWakeup
+
+    while True:
+        await ttnEvent.wait()
+        ttnEvent.clear()
+
+        # cleared before draining, so packet queued later wakes again
+        ttnWakeup = False
+
+        while len(ttnQueue) > 0:
+            processNewPacket(*ttnQueue.popleft())
+
+        trimHistory()
 
-    print("Write char and hit enter!")
+async def yagsTask():
+    while True:
+        packets = await asyncio.to_thread(ob.getPackets)
+
+        for packet in packets:
+            if packet["time"] > lastRawPacketTime:
+                processNewRawPacket(packet)
+
+        trimHistory()
+
+        await asyncio.sleep(YAGS_POLL_INTERVAL)
+
+async def tuiTask():
+    while True:
+        if not dialogActive:
+            data = drawTUI(updateTUI())
+
+            # slow terminal blocks worker thread, not packet processing
+            if data != "":
+                await asyncio.to_thread(writeTUI, data)
+
+        await asyncio.sleep(TUI_MIN_INTERVAL)
+
+        try:
+            await asyncio.wait_for(tuiEvent.wait(), TUI_INTERVAL - TUI_MIN_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+        tuiEvent.clear()
+
+def processCommand(command):
+    global TTNForDownLink
+    global lastTUILines
+    global currentSession
+
+    if command == "T":
+        TTNForDownLink = not(TTNForDownLink)
+
+    if command == "D":
+        currentSession = sessions[(sessions.index(currentSession) + 1) % len(sessions)]
+
+    lastTUILines = None # command and dialog were written over TUI
+
+    uplinkEvent.set()
+    tuiEvent.set()
+
+def statusSnapshot():
+    dt = datetime.datetime.now(datetime.timezone.utc)
+    utc_time = dt.replace(tzinfo=datetime.timezone.utc)
+    utc_timestamp = int(utc_time.timestamp())
+
+    return {
+        "time":           utc_timestamp,
+        "ttnForUplinks":  TTNForDownLink,
+        "rejectedFrames": rejectedFrames,
+        "ttnQueue":       dict(ttnQueueStats, depth = len(ttnQueue), size = TTN_QUEUE_SIZE),
+        "sessions":       {session.name: sessionSnapshot(session) for session in sessions}
+    }
+
+def sessionSnapshot(session):
+    return {
+        "status":         session.status,
+        "uplinks":        session.upCounter,
+        "downlinks":      session.packetsCount,
+        "planedUplinks":  len(session.planedUplinks),
+        "timePerUplink":  session.lastUplinkTime,                              # sec
+        "uplinkETA":      session.lastUplinkTime * len(session.planedUplinks), # sec to send all planed uplinks
+        "lastPacketTime": session.lastPacketTime,
+        "lastSnr":        session.lastPacketSnr,
+        "lastRssi":       session.lastPacketRSSI,
+        "lastFError":     session.lastFError,
+        "duplicates":     session.dedupIndex.merged
+    }
+
+def writeStatusFile(data):
+    # readers never see half written file
+    tmp = args.status_file + ".tmp"
+
+    with open(tmp, "w") as f:
+        f.write(data)
+
+    os.replace(tmp, args.status_file)
+
+async def statusTask():
+    while True:
+        await asyncio.to_thread(writeStatusFile, json.dumps(statusSnapshot()))
+        await asyncio.sleep(STATUS_INTERVAL)
+
+def controlCommand(line):
+    # commands of headless mode, returns reply
+    #   T                       on/off TTN for uplinks
+    #   E                       EEPROM setup
+    #   C <addr> <hex data>     copy data to EEPROM with verification
+    #   W <addr> <hex byte>     custom write uplink
+    #   R <addr> <size> [<dr index> <freq index>] custom read uplink, raw if indexes are given
+    #   S                       status snapshot
+    # command is for first device, or for other one with prefix @<name>, e.g. "@ppico2 W 100 0a"
+    words   = line.split()
+    session = sessions[0]
+
+    if len(words) > 0 and words[0].startswith("@"):
+        session = next((s for s in sessions if s.name == words[0][1:]), None)
+        words   = words[1:]
+
+        if session is None:
+            return {"ok": False, "error": f"unknown device {line.split()[0][1:]}"}
+
+    if len(words) == 0:
+        return {"ok": False, "error": "empty command"}
+
+    command = words[0].upper()
+
+    try:
+        if command == "T" and len(words) == 1:
+            processCommand(command)
+        elif command == "E" and len(words) == 1:
+            planEEPROMSetup(session)
+        elif command == "C" and len(words) == 3:
+            planUserEECPY(session, int(words[1]), words[2])
+        elif command == "W" and len(words) == 3:
+            planCustomWrite(session, int(words[1]), int(words[2], 16))
+        elif command == "R" and len(words) == 3:
+            planCustomRead(session, int(words[1]), int(words[2]))
+        elif command == "R" and len(words) == 5:
+            planCustomRead(session, int(words[1]), int(words[2]), True, int(words[4]) * 3, int(words[3]) * 3)
+        elif command != "S":
+            return {"ok": False, "error": f"unknown command {line.strip()}"}
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+
+    return {"ok": True, "status": statusSnapshot()}
+
+async def controlClient(reader, writer):
+    while True:
+        line = await reader.readline()
+
+        if line == b"":
+            break
+
+        reply = controlCommand(line.decode("utf-8", "replace"))
+
+        writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+        await writer.drain()
+
+    writer.close()
+
+def stdinReader():
+    # stdin and dialogs block on input(), so they have own thread
+    global dialogActive
+
+    dialogs = {
+        "E": setupEEPROM,
+        "U": customUplink,
+        "A": advanced
+    }
+
+    while True:
+        line = sys.stdin.readline()
+
+        if line == "":
+            return # stdin closed
+
+        command = line.strip().upper()
+
+        if command in dialogs:
+            dialogActive = True
+
+            try:
+                dialogs[command]()
+            except ValueError: # wrong number in dialog
+                pass
+
+            dialogActive = False
+
+        mainLoop.call_soon_threadsafe(processCommand, command)
 
 mqttc = None
 
@@ -619,73 +1177,39 @@ if args.ttn_host is not None:
     )
     mqttc.subscribe("#", 0)
 
-    mqttc.loop_start()
+async def main():
+    global mainLoop
+    global uplinkEvent
+    global tuiEvent
+    global ttnEvent
 
-while True:
-    dt = datetime.datetime.now(datetime.timezone.utc)
-    utc_time = dt.replace(tzinfo=datetime.timezone.utc)
-    utc_timestamp = int(utc_time.timestamp())
+    mainLoop    = asyncio.get_running_loop()
+    uplinkEvent = asyncio.Event()
+    tuiEvent    = asyncio.Event()
+    ttnEvent    = asyncio.Event()
 
-    # proccess uplinks
-    if len(planedUplinks) > 0 and planedUplinks[0]["send"]:
-        uplinkJob   = None
-        validUplink = True
-
-        if not TTNForDownLink and sat is not None:
-            uplinkJob = sat.planUplink(station, loraWanMac(planedUplinks[0]["data"], DEV_ADDR), delay=RX_WINDOW_DELAY)
-        elif TTNForDownLink and mqttc is not None:
-            mqttc.publish(f"v3/{args.ttn_app}/devices/{args.ttn_dev}/down/replace", '{"downlinks":[{"f_port": 1,"frm_payload":"' + base64.b64encode(bytes.fromhex(planedUplinks[0]["data"])).decode("ascii") + '","priority": "NORMAL"}]}')
-        else:
-            status = "unable to plan Uplink"
-            validUplink = False
+    if mqttc is not None:
+        mqttc.loop_start()
 
-        if validUplink:
-            upCounter += 1
+    tasks = [uplinkTask()]
 
-            if planedUplinks[0]["status"] is not None:
-                status = planedUplinks[0]["status"]
+    if args.headless:
+        if args.control_port is not None:
+            # only local clients, there is no authentication
+            await asyncio.start_server(controlClient, "127.0.0.1", args.control_port)
+    else:
+        threading.Thread(target=stdinReader, daemon=True).start()
+        tasks.append(tuiTask())
 
-            if planedUplinks[0]["expected"] is not None:
-                planedUplinks[0]["send"]   = False
-                planedUplinks[0]["uplink"] = uplinkJob
-                planedUplinks[0]["start"]  = utc_timestamp
-            else:
-                planedUplinks.pop(0)
+    if args.status_file is not None:
+        tasks.append(statusTask())
 
-    packets = []
-    
     if ob is not None:
-        packets = ob.getPackets()
-
-    for packet in packets:
-        if packet["time"] > lastRawPacketTime:
-            processNewRawPacket(packet)
-
-    updateTUI()
-
-    # remeve old packets
-    if len(lastPackets) > 5:
-        lastPackets.pop(0)
-
-    if len(lastLWPackets) > 5:
-        lastLWPackets.pop(0)
-
-    if len(lastTelemetry) > 5:
-        lastTelemetry.pop(0)
-
-    i, o, e = select.select([sys.stdin], [], [], 3)
-
-    if (i): # process command
-        command = sys.stdin.readline().strip().upper()
-
-        if command == "E":
-            setupEEPROM()
+        tasks.append(yagsTask())
 
-        if command == "U":
-            customUplink()
+    if mqttc is not None:
+        tasks.append(ttnTask())
 
-        if command == "T":
-            TTNForDownLink = not(TTNForDownLink)
+    await asyncio.gather(*tasks)
 
-        if command == "A":
-            advanced()
+asyncio.run(main())
@@ -0,0 +1,121 @@
+import sys
+import math
+import time
+import argparse
+import numpy as np
+
+# same as in ppico
+BASELINE         = 1013.25
+TELEMETRY_PORT   = 1
+TELEMETRY_LENGTH = 5 # RST SOLAR TEMP PRESS HPTR, 1B each
+
+# columns of port 1 telemetry as parseTelemetry in ppico makes them
+TELEMETRY_DTYPE = np.dtype([
+    ("rst",   np.uint8),
+    ("solar", np.float64),
+    ("temp",  np.float64),
+    ("press", np.int32),
+    ("hptr",  np.uint8),
+    ("alt",   np.float64),
+])
+
+# columns of packet.csv copied into telemetry.csv
+PACKET_COLUMNS = ("lat", "lon", "gs", "stations", "time")
+
+# altitude by PRESS byte, math.pow as in ppico gives same digits as telemetry.csv
+ALTITUDES = np.array([44330 * (1.0 - math.pow((press * 4) / BASELINE, 0.1903)) for press in range(256)])
+
+# ASCII code to value of hex digit, 0xFF for other characters
+HEX_DIGITS = np.full(256, 0xFF, dtype = np.uint8)
+
+for i, c in enumerate(b"0123456789abcdef"):
+    HEX_DIGITS[c] = i
+
+for i, c in enumerate(b"0123456789ABCDEF"):
+    HEX_DIGITS[c] = i
+
+def decodeTelemetry(payloads):
+    # payloads in uint8 array N x 5 (longer rows are cut), returns structured array of N telemetries
+    payloads = np.asarray(payloads, dtype = np.uint8)
+
+    if payloads.ndim != 2 or payloads.shape[1] < TELEMETRY_LENGTH:
+        raise ValueError(f"payloads must be N x {TELEMETRY_LENGTH} or wider, not {payloads.shape}")
+
+    telemetry = np.empty(len(payloads), dtype = TELEMETRY_DTYPE)
+
+    telemetry["rst"]   = payloads[:, 0]
+    telemetry["solar"] = (payloads[:, 1] / 255) * 2.56
+    telemetry["temp"]  = payloads[:, 2].view(np.int8) / 2
+    telemetry["press"] = payloads[:, 3].astype(np.int32) * 4
+    telemetry["hptr"]  = payloads[:, 4]
+    telemetry["alt"]   = ALTITUDES[payloads[:, 3]]
+
+    return telemetry
+
+def hexToPayloads(data, length = TELEMETRY_LENGTH):
+    # hex strings to uint8 array N x length, all strings must have at least length bytes
+    digits = np.frombuffer("".join(d[:length * 2] for d in data).encode("ascii"), dtype = np.uint8)
+
+    if len(digits) != len(data) * length * 2:
+        raise ValueError(f"all payloads must have {length} bytes at least")
+
+    digits = HEX_DIGITS[digits]
+
+    if (digits == 0xFF).any():
+        raise ValueError("payloads must be in hex")
+
+    digits = digits.reshape(len(data), length, 2)
+
+    return digits[:, :, 0] * 16 + digits[:, :, 1]
+
+def readPacketCsv(filename, port = TELEMETRY_PORT, length = TELEMETRY_LENGTH):
+    # rows of packet.csv on port with payload long enough, returns (hex payloads, rows)
+    data = []
+    rows = []
+
+    with open(filename, "r") as f:
+        header = f.readline().rstrip("\n").split(";")
+
+        for line in f:
+            row = dict(zip(header, line.rstrip("\n").split(";")))
+
+            # packets from yags were written with time before data under header of TTN packet
+            if "time" in row and "data" in row and not row["time"].isdigit():
+                row["time"], row["data"] = row["data"], row["time"]
+
+            if row.get("port") != str(port) or len(row.get("data", "")) < length * 2:
+                continue
+
+            data.append(row["data"])
+            rows.append(row)
+
+    return data, rows
+
+def writeTelemetryCsv(filename, telemetry, rows):
+    # same format as addToCsv in ppico
+    columns = TELEMETRY_DTYPE.names + PACKET_COLUMNS
+
+    with open(filename, "w") as f:
+        f.write("".join(f"{k};" for k in columns) + "\n")
+
+        for t, row in zip(telemetry.tolist(), rows):
+            f.write("".join(f"{v};" for v in t) + "".join(f"{row[k]};" for k in PACKET_COLUMNS) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recompute telemetry of PPICO V1 mission from packet.csv at once')
+
+    parser.add_argument('packets',     type=str, nargs='?', default='packet.csv', help='packet.csv written by ppico')
+    parser.add_argument('--output',    type=str, help='write telemetry.csv to this file')
+
+    args = parser.parse_args()
+
+    data, rows = readPacketCsv(args.packets)
+
+    t0 = time.perf_counter()
+    telemetry = decodeTelemetry(hexToPayloads(data))
+    t1 = time.perf_counter()
+
+    print(f"{len(telemetry)} telemetries decoded in {(t1 - t0) * 1000:.3f}ms", file = sys.stderr)
+
+    if args.output is not None:
+        writeTelemetryCsv(args.output, telemetry, rows)